@@ -0,0 +1,70 @@
+"""
+Benchmark the startup cost of importing project_reporter.
+
+Each statement is timed in fresh Python processes, so that no module is already imported, and the results are printed as JSON or written to a JSON file.
+
+Usage::
+
+    python benchmarks/bench_import.py [--repeat 10] [--output import.json]
+
+"""
+from pathlib import Path
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+
+
+ROOT = Path(__file__).resolve().parent.parent
+
+#: Statements to time, by name
+STATEMENTS = {
+    'import': 'import project_reporter',
+    'import_and_read_config': 'import project_reporter as pr; '
+      'pr.read_config({!r})'.format(
+      str(ROOT/'data'/'project_a_config.yaml')),
+    }
+
+TEMPLATE = '''
+import time
+t = time.perf_counter()
+{statement}
+print(time.perf_counter() - t)
+'''
+
+def time_statement(statement, repeat):
+    """
+    Time the given statement in ``repeat`` fresh Python processes and return the list of times in seconds.
+    """
+    times = []
+    for __ in range(repeat):
+        out = subprocess.check_output([sys.executable, '-c', 
+          TEMPLATE.format(statement=statement)], cwd=str(ROOT))
+        times.append(float(out.decode().strip().splitlines()[-1]))
+    return times
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--repeat', type=int, default=10)
+    parser.add_argument('--output', default=None)
+    args = parser.parse_args()
+
+    results = []
+    for name, statement in STATEMENTS.items():
+        times = time_statement(statement, args.repeat)
+        results.append({
+            'benchmark': name,
+            'repeat': args.repeat,
+            'median_seconds': statistics.median(times),
+            'min_seconds': min(times),
+            })
+
+    text = json.dumps(results, indent=2)
+    if args.output is None:
+        print(text)
+    else:
+        Path(args.output).write_text(text)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,169 @@
+"""
+Generate synthetic project data for benchmarks.
+
+Write a project configuration file, a CSV timesheet, and a Replicon Excel XML timesheet describing the same work, of configurable size and reproducible from a random seed.
+The files are written in chunks, so even very large timesheets are generated in bounded memory.
+
+Usage::
+
+    python benchmarks/generate.py OUTPUT_DIR --rows 100000 --tasks 50 --workers 200 [--seed 0]
+
+"""
+from pathlib import Path
+import argparse
+
+import numpy as np
+import pandas as pd
+
+
+#: Possible durations of a timesheet entry in hours
+DURATIONS = np.arange(1, 33)/4
+
+#: Rows of the Replicon report preamble; the header follows them
+PREAMBLE = [
+    'My report',
+    'Report Date : ',
+    'Access Level:',
+    'Date Range : ',
+    'Project : ',
+    'Client : ',
+    'User : ',
+    'Department (Historical) : ',
+    'Approval Status : ',
+    'Time Entry Status : ',
+    'Generated By:',
+    ]
+
+REPLICON_COLS = ['', 'Task Name', 'User Name', 'Client Name', 
+  'Billable Hrs', 'Non-Billable Hrs', 'Total Hrs', 'Entry Date', 
+  'Employee Id']
+
+XML_HEAD = '''<?xml version="1.0" encoding="UTF-8"?>
+<?mso-application progid="Excel.Sheet"?><Workbook xmlns="urn:schemas-microsoft-com:office:spreadsheet" xmlns:ss="urn:schemas-microsoft-com:office:spreadsheet"><ss:Worksheet ss:Name="Report"><Table>'''
+
+XML_TAIL = '</Table></ss:Worksheet></Workbook>\n'
+
+def get_names(num_tasks, num_workers):
+    """
+    Return a pair of lists (task names, worker (given name, surname) pairs) of the given lengths.
+    """
+    tasks = ['Task {:05d}'.format(i) for i in range(num_tasks)]
+    workers = [('Given{:05d}'.format(i), 'Surname{:05d}'.format(i)) 
+      for i in range(num_workers)]
+    return tasks, workers
+
+def write_config(path, tasks, workers, rng):
+    """
+    Write a project configuration YAML file with the given tasks and workers to the given path, with random budgets and rates.
+    """
+    budgets = rng.randint(1, 100, size=len(tasks))*1000
+    rates = rng.randint(50, 300, size=len(workers))
+    lines = [
+        'name: Synthetic project',
+        'description: Generated for benchmarks',
+        'client: Benchmark client',
+        'budget: {!s}'.format(budgets.sum()),
+        'currency: NZD',
+        'tasks_df: |',
+        '    task,budget',
+        ]
+    lines.extend('    {!s},{!s}'.format(t, b) for t, b in zip(tasks, budgets))
+    lines.extend(['workers_df: |', '    worker,rate'])
+    lines.extend('    {!s} {!s},{!s}'.format(g, s, r) 
+      for (g, s), r in zip(workers, rates))
+    Path(path).write_text('\n'.join(lines) + '\n')
+
+def iter_chunks(num_rows, num_tasks, num_workers, num_days, start_date, 
+  rng, chunk_size=10**6):
+    """
+    Yield random timesheet rows as tuples of NumPy arrays (dates, task indices, worker indices, durations) of at most ``chunk_size`` rows each and ``num_rows`` rows in total.
+    """
+    start = np.datetime64(start_date, 'D')
+    for k in range(0, num_rows, chunk_size):
+        n = min(chunk_size, num_rows - k)
+        yield (
+          start + rng.randint(0, num_days, size=n),
+          rng.randint(0, num_tasks, size=n),
+          rng.randint(0, num_workers, size=n),
+          rng.choice(DURATIONS, size=n),
+          )
+
+def xml_row(cells):
+    return '<Row>' + ''.join(
+      '<Cell><Data ss:Type="String">{!s}</Data></Cell>'.format(c) 
+      if c else '<Cell/>' for c in cells) + '</Row>'
+
+def generate(output_dir, num_rows, num_tasks, num_workers, num_days=365,
+  start_date='2016-01-01', seed=0, replicon=True):
+    """
+    Write the files ``config.yaml``, ``timesheet.csv``, and, if ``replicon``, ``replicon_timesheet.xml`` for a random project with the given numbers of timesheet rows, tasks, workers, and days to the given directory.
+    Return a dictionary of the paths written.
+    """
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    rng = np.random.RandomState(seed)
+    tasks, workers = get_names(num_tasks, num_workers)
+    paths = {
+        'config': output_dir/'config.yaml',
+        'csv': output_dir/'timesheet.csv',
+        }
+    write_config(paths['config'], tasks, workers, rng)
+
+    task_names = np.array(tasks, dtype=object)
+    csv_workers = np.array(['{!s} {!s}'.format(g, s) for g, s in workers],
+      dtype=object)
+    replicon_workers = np.array(['{!s}, {!s}'.format(s, g) 
+      for g, s in workers], dtype=object)
+
+    csv = paths['csv'].open('w')
+    csv.write('date,task,worker,duration\n')
+    if replicon:
+        paths['replicon'] = output_dir/'replicon_timesheet.xml'
+        xml = paths['replicon'].open('w')
+        xml.write(XML_HEAD)
+        for label in PREAMBLE:
+            xml.write(xml_row([label] + ['']*(len(REPLICON_COLS) - 1)))
+        xml.write(xml_row(REPLICON_COLS))
+        xml.write(xml_row(['Synthetic project'] + 
+          ['']*(len(REPLICON_COLS) - 1)))
+
+    for dates, i, j, durations in iter_chunks(num_rows, num_tasks, 
+      num_workers, num_days, start_date, rng):
+        dates = pd.DatetimeIndex(dates).strftime('%Y-%m-%d')
+        f = pd.DataFrame({
+          'date': dates,
+          'task': task_names[i],
+          'worker': csv_workers[j],
+          'duration': durations,
+          })
+        f[['date', 'task', 'worker', 'duration']].to_csv(csv, header=False, 
+          index=False)
+        if replicon:
+            hours = ['{:g}'.format(d) for d in durations]
+            xml.write(''.join(xml_row(['', t, w, 'Benchmark client', h, '0', 
+              h, d + 'T00:00:00.000', 'id{:05d}'.format(k)])
+              for t, w, h, d, k in zip(task_names[i], replicon_workers[j], 
+              hours, dates, j)))
+
+    csv.close()
+    if replicon:
+        xml.write(XML_TAIL)
+        xml.close()
+
+    return paths
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('output_dir')
+    parser.add_argument('--rows', type=int, default=10**5)
+    parser.add_argument('--tasks', type=int, default=20)
+    parser.add_argument('--workers', type=int, default=50)
+    parser.add_argument('--days', type=int, default=365)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--no-replicon', action='store_true')
+    args = parser.parse_args()
+    generate(args.output_dir, args.rows, args.tasks, args.workers, 
+      num_days=args.days, seed=args.seed, replicon=not args.no_replicon)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,137 @@
+"""
+Benchmark the reporting pipeline on synthetic projects.
+
+For each requested project size, generate a project with ``generate.py``, then time each stage of the pipeline and measure its peak memory, and write the results as JSON records so that runs on different versions can be compared.
+
+Usage::
+
+    python benchmarks/run.py --sizes 10000,100000 --tasks 20 --workers 50 --output results.json
+
+"""
+from pathlib import Path
+import argparse
+import itertools
+import json
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+import pandas as pd
+
+import project_reporter as pr
+import generate as gn
+
+
+def measure(func, memory=True):
+    """
+    Call ``func()`` and return the triple (result, time in seconds, peak memory in bytes allocated during the call).
+    Memory is measured with :mod:`tracemalloc` in a second call, so that tracing does not slow the timed call; it is ``None`` if not ``memory``.
+    """
+    t = time.perf_counter()
+    result = func()
+    seconds = time.perf_counter() - t
+
+    peak = None
+    if memory:
+        tracemalloc.start()
+        func()
+        __, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+    return result, seconds, peak
+
+def get_stages(paths, freqs):
+    """
+    Return a list of pairs (stage name, function of a dictionary of earlier results) for the given generated project paths.
+    Each function returns its stage's result, which is stored in the dictionary under the stage name.
+    The stages after ``'validate'`` work on a fresh copy of the validated project (see :meth:`project.Project.copy`) on every call, so that neither the timed call nor the memory call finds its result, or the costs it needs, in the project memo.
+    """
+    stages = [
+        ('read_config', lambda r: pr.read_config(paths['config'])),
+        ('read_timesheet_csv', lambda r: pr.read_timesheet(paths['csv'])),
+        ]
+    if 'replicon' in paths:
+        stages.extend([
+            ('read_replicon', lambda r: pr.read_replicon(paths['replicon'])),
+            ('reformat_replicon', 
+              lambda r: pr.reformat_replicon(r['read_replicon'])),
+            ])
+    stages.append(('validate', lambda r: pr.Project(
+      timesheet_df=r['read_timesheet_csv'], **r['read_config'])))
+    stages.append(('compute_costs', 
+      lambda r: pr.compute_costs(r['validate'].copy())))
+    for by_task, by_worker, freq in itertools.product([False, True], 
+      [False, True], freqs):
+        name = 'summarize(by_task={!s},by_worker={!s},freq={!s})'.format(
+          by_task, by_worker, freq)
+        stages.append((name, lambda r, t=by_task, w=by_worker, f=freq: 
+          pr.summarize(r['validate'].copy(), by_task=t, by_worker=w, 
+          freq=f)))
+    for freq in freqs:
+        stages.append(('plot(freq={!s})'.format(freq), 
+          lambda r, f=freq: pr.plot(r['validate'].copy(), freq=f)))
+    return stages
+
+def get_version():
+    try:
+        return subprocess.check_output(['git', 'describe', '--always', 
+          '--dirty'], cwd=str(ROOT), stderr=subprocess.DEVNULL)\
+          .decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--sizes', default='10000,100000', 
+      help='comma-separated numbers of timesheet rows')
+    parser.add_argument('--tasks', type=int, default=20)
+    parser.add_argument('--workers', type=int, default=50)
+    parser.add_argument('--days', type=int, default=365)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--freqs', default='None,W,MS',
+      help='comma-separated summary frequencies; None for no frequency')
+    parser.add_argument('--no-replicon', action='store_true')
+    parser.add_argument('--no-memory', action='store_true')
+    parser.add_argument('--data-dir', default=None, 
+      help='directory for generated data; defaults to a temporary one')
+    parser.add_argument('--output', default='benchmark_results.json')
+    args = parser.parse_args()
+
+    freqs = [None if f == 'None' else f for f in args.freqs.split(',')]
+    common = {
+        'version': get_version(),
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'tasks': args.tasks,
+        'workers': args.workers,
+        'days': args.days,
+        'seed': args.seed,
+        }
+    records = []
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for size in [int(s) for s in args.sizes.split(',')]:
+            data_dir = Path(args.data_dir or tmp_dir)/'rows_{!s}'.format(size)
+            paths = gn.generate(data_dir, size, args.tasks, args.workers, 
+              num_days=args.days, seed=args.seed, 
+              replicon=not args.no_replicon)
+            results = {}
+            for name, func in get_stages(paths, freqs):
+                result, seconds, peak = measure(lambda: func(results),
+                  memory=not args.no_memory)
+                results[name] = result
+                record = dict(common, rows=size, stage=name, 
+                  seconds=seconds, peak_bytes=peak)
+                records.append(record)
+                print('{rows:>10} {stage:<55} {seconds:10.4f}s'.format(
+                  **record))
+
+    Path(args.output).write_text(json.dumps(records, indent=2))
+
+if __name__ == '__main__':
+    main()
@@ -1,5 +1,103 @@
+"""
+Heavy and optional dependencies are imported only when first needed: the plotting libraries when a chart is made, python-magic and the XML parser when a timesheet is read, and the modules listed in ``LAZY_NAMES`` below when they or one of their names are first accessed.
+"""
 from .constants import *
 from .utilities import *
 from .project import *
-from .replicon import *
-from .main import *
\ No newline at end of file
+from .cache import *
+from .cube import *
+from .store import *
+from .main import *
+from .instrument import *
+from .window import *
+from .scenario import *
+
+
+#: Public names of the lazily imported modules, by module
+LAZY_NAMES = {
+    'replicon': [
+        'ExcelHandler', 
+        'RowHandler', 
+        'iter_replicon', 
+        'read_replicon', 
+        'reformat_replicon',
+        'read_replicon_file',
+        'is_pattern',
+        'get_paths',
+        'read_replicons',
+        ],
+    'portfolio': [
+        'SUMMARY_COLS', 
+        'find_pairs', 
+        'parse_pairs',
+        'report_project', 
+        'run_portfolio', 
+        'run_cli',
+        ],
+    'ingest': [
+        'HashIndex',
+        'hash_timesheet',
+        'ingest_timesheet',
+        'ingest_replicons',
+        ],
+    'server': [
+        'ReportServer',
+        'serve',
+        'serve_cli',
+        ],
+    }
+
+#: Names exported by ``from project_reporter import *``: the public names of the modules imported above, and the lazy names, which :func:`__getattr__` resolves during the import
+__all__ = [
+    # constants
+    'PROJECT_ATTRS', 'DTYPE', 'MAX_MEMO_SIZE',
+    # utilities
+    'parse_df', 'add_opacity', 'get_colors', 'get_positions', 
+    'get_asof_positions', 'get_periods', 'get_effective_rates', 
+    'concat_categoricals', 'compact_timesheet', 'expand_timesheet', 
+    'get_nbytes',
+    # project
+    'Project', 'read_config', 'read_timesheet', 'iter_timesheet', 
+    'stream_timesheet', 'read_project', 'write_project', 'read_snapshot', 
+    'read_store_project', 'check_str', 'check_pos', 'check_df_instance', 
+    'df_nonempty', 'check_df_nonempty', 'check_df_header', 'df_no_nans', 
+    'check_df_no_nans', 'check_df', 'is_float', 'check_float_column', 
+    'check_unique_column', 'check_tasks_df', 'check_workers_df', 
+    'check_rates_df', 'find_timesheet_problems', 'check_timesheet_df',
+    # cache
+    'FORMAT_VERSION', 'write_frame', 'read_frame', 'get_cache_key', 
+    'get_size', 'evict', 'cached',
+    # cube
+    'Cube',
+    # store
+    'SCHEMA', 'RATE', 'DAY', 'to_days', 'Store',
+    # main
+    'compute_costs', 'get_rates', 'aggregate_costs', 'build_cube', 
+    'get_date_index', 'get_window_totals', 'summarize', 'build_chart_data', 
+    'forecast_costs', 'plot', 'plot_bak',
+    # instrument
+    'CALLBACKS', 'StageRecord', 'add_callback', 'remove_callback', 
+    'get_memory', 'stage', 'Recorder',
+    # window
+    'to_datetime64', 'DateIndex',
+    # scenario
+    'make_scenario', 'compare_scenarios',
+    ] + [n for names in LAZY_NAMES.values() for n in names]
+
+def __getattr__(name):
+    import importlib
+
+    if name in LAZY_NAMES:
+        return importlib.import_module('.' + name, __name__)
+    for module_name, names in LAZY_NAMES.items():
+        if name in names:
+            module = importlib.import_module('.' + module_name, __name__)
+            value = getattr(module, name)
+            globals()[name] = value
+            return value
+    raise AttributeError('module {!r} has no attribute {!r}'.format(
+      __name__, name))
+
+def __dir__():
+    return sorted(set(globals()) | set(LAZY_NAMES) |
+      {n for names in LAZY_NAMES.values() for n in names})
@@ -0,0 +1,154 @@
+"""
+This module implements a simple on-disk columnar format for data frames and a cache of parsed timesheets built on it.
+
+A frame is stored as a directory containing a JSON file describing the columns and one NumPy ``.npy`` file per array.
+Categorical and string columns are stored as integer codes plus a small array of categories, datetime columns as ``datetime64[ns]`` and the rest as plain arrays, so loading a frame amounts to reading a few contiguous arrays.
+"""
+from pathlib import Path
+import os
+import json
+import shutil
+import hashlib
+import uuid
+from collections import OrderedDict
+
+import pandas as pd
+import numpy as np
+
+
+#: Version of the storage format; part of every cache key
+FORMAT_VERSION = 1
+
+def write_frame(f, path, replace=True):
+    """
+    Write the given data frame to a directory at the given path in the columnar format described in the module docstring, overwriting any existing directory there if ``replace`` and keeping it otherwise.
+    The index of the data frame is not stored.
+    The directory is written under a temporary name and then renamed, so readers never see a partial frame, and if not ``replace``, then writers racing to write the same path keep whichever frame was renamed first.
+    """
+    path = Path(path)
+    tmp_path = path.parent/'.{!s}.{!s}'.format(path.name, uuid.uuid4().hex)
+    tmp_path.mkdir(parents=True)
+    columns = []
+    for i, col in enumerate(f.columns):
+        s = f[col]
+        if pd.api.types.is_numeric_dtype(s):
+            kind = 'values'
+            np.save(str(tmp_path/'{!s}.npy'.format(i)), s.values)
+        elif pd.api.types.is_datetime64_any_dtype(s):
+            kind = 'datetime'
+            np.save(str(tmp_path/'{!s}.npy'.format(i)), 
+              s.values.astype('M8[ns]'))
+        else:
+            # Store categoricals and strings as codes plus categories
+            kind = 'category' if hasattr(s, 'cat') else 'object'
+            if kind == 'object':
+                s = s.astype('category')
+            np.save(str(tmp_path/'{!s}.npy'.format(i)), s.cat.codes.values)
+            np.save(str(tmp_path/'{!s}_categories.npy'.format(i)), 
+              np.array(list(s.cat.categories)))
+        columns.append({'name': col, 'kind': kind})
+
+    with (tmp_path/'meta.json').open('w') as tgt:
+        json.dump({'version': FORMAT_VERSION, 'columns': columns}, tgt)
+
+    if replace and path.exists():
+        shutil.rmtree(str(path))
+    try:
+        os.replace(str(tmp_path), str(path))
+    except OSError:
+        # Another writer got there first
+        shutil.rmtree(str(tmp_path), ignore_errors=True)
+        if replace or not path.exists():
+            raise
+
+def read_frame(path, mmap_mode=None):
+    """
+    Read a data frame written by :func:`write_frame` to the directory at the given path and return it.
+    The arrays are loaded with :func:`numpy.load` using the given ``mmap_mode`` and wrapped by the data frame without copying where Pandas allows, so that with a ``mmap_mode`` the numerical, datetime, and categorical code columns stay memory-mapped from the files, and only string columns are copied.
+    """
+    path = Path(path)
+    with (path/'meta.json').open() as src:
+        meta = json.load(src)
+
+    data = []
+    for i, column in enumerate(meta['columns']):
+        values = np.load(str(path/'{!s}.npy'.format(i)), mmap_mode=mmap_mode)
+        kind = column['kind']
+        if kind in ['category', 'object']:
+            categories = np.load(str(path/'{!s}_categories.npy'.format(i)))
+            values = pd.Categorical.from_codes(values, categories)
+            if kind == 'object':
+                values = np.asarray(values, dtype=object)
+        data.append((column['name'], values))
+
+    return pd.DataFrame(OrderedDict(data), copy=False)
+
+def get_cache_key(path, options=None, hash_content=False):
+    """
+    Return a hex string that identifies the file at the given path, in its current state, together with the given dictionary of reading options.
+    The file is identified by its resolved path, size, and modification time or, if ``hash_content``, by the SHA-1 hash of its contents.
+    """
+    path = Path(path).resolve()
+    stat = path.stat()
+    if hash_content:
+        h = hashlib.sha1()
+        with path.open('rb') as src:
+            for chunk in iter(lambda: src.read(2**20), b''):
+                h.update(chunk)
+        state = h.hexdigest()
+    else:
+        state = stat.st_mtime_ns
+    key = [FORMAT_VERSION, str(path), stat.st_size, state, 
+      sorted((options or {}).items())]
+    return hashlib.sha1(json.dumps(key, default=str).encode()).hexdigest()
+
+def get_size(path):
+    """
+    Return the total size in bytes of the files in the directory at the given path.
+    """
+    return sum(p.stat().st_size for p in Path(path).iterdir())
+
+def evict(cache_dir, max_size):
+    """
+    Delete the least recently used frames in the given cache directory until the cache occupies at most ``max_size`` bytes.
+    Frames that other processes sharing the cache delete meanwhile are skipped.
+    """
+    entries = []
+    for p in Path(cache_dir).iterdir():
+        if p.name.startswith('.'):
+            continue
+        try:
+            if p.is_dir():
+                entries.append((p.stat().st_mtime, get_size(p), p))
+        except FileNotFoundError:
+            pass
+
+    total = sum(size for __, size, __ in entries)
+    for __, size, p in sorted(entries, key=lambda x: x[0]):
+        if total <= max_size:
+            break
+        shutil.rmtree(str(p), ignore_errors=True)
+        total -= size
+
+def cached(read, path, cache_dir, options=None, max_size=2**30, 
+  hash_content=False):
+    """
+    Return ``read(path)``, a data frame, loading it from the given cache directory if it has been stored there for the current state of the file and ``options``, and storing it otherwise.
+    Hits mark the entry as recently used, and the cache is trimmed to ``max_size`` bytes with :func:`evict` after each store.
+
+    The cache directory can be shared by several processes: an entry that another process evicts while it is being loaded counts as a miss, and an entry that another process stores first is kept.
+    """
+    cache_dir = Path(cache_dir)
+    entry = cache_dir/get_cache_key(path, options, hash_content=hash_content)
+    if (entry/'meta.json').exists():
+        try:
+            os.utime(str(entry), None)
+            return read_frame(entry)
+        except FileNotFoundError:
+            pass
+
+    f = read(path)
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    write_frame(f, entry, replace=False)
+    evict(cache_dir, max_size)
+    return f
@@ -6,6 +6,7 @@ PROJECT_ATTRS = [
   'currency',
   'tasks_df',
   'workers_df',
+  'rates_df',
   'timesheet_df',
   ]
 
@@ -17,3 +18,6 @@ DTYPE = {
   'budget': float,
   'rate': float,
   }
+
+#: Maximum number of results memoized per project
+MAX_MEMO_SIZE = 32
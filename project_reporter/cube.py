@@ -0,0 +1,221 @@
+"""
+This module implements cost cubes.
+A *cube* holds the durations and costs of a project's timesheet summed by task, by worker, and by day in dense NumPy arrays, so that any summary of the timesheet can be computed by summing the arrays along some axes instead of regrouping the timesheet rows.
+
+CONVENTIONS:
+    - A cube array has shape (number of tasks, number of workers, number of days), with tasks and workers in sorted order and days consecutive from the cube's start day
+    - The size of a cube is proportional to the product of those three numbers and not to the number of timesheet rows
+"""
+import pandas as pd
+import numpy as np
+
+import project_reporter.utilities as ut 
+
+
+class Cube(object):
+    """
+    This class encodes a cost cube.
+    Each instance has the following properties.
+
+    - ``tasks``: Pandas Index; sorted task names
+    - ``workers``: Pandas Index; sorted worker names
+    - ``task_budgets``: NumPy array; budget of each task 
+    - ``rates``: NumPy array; rate of each worker
+    - ``start``: NumPy datetime64 day; first day of the cube or ``None`` if the cube is empty
+    - ``num_days``: integer; number of days covered by the cube
+    - ``duration``, ``cost``: NumPy float arrays; durations and costs by task, worker, and day
+    - ``count``: NumPy integer array; number of timesheet rows by task, worker, and day
+    - ``shared``: boolean; ``True`` if the arrays may be shared with other cubes, in which case they are copied before rows are added; see :meth:`copy`
+
+    The arrays may be allocated beyond ``num_days`` days to make adding later days cheap; only their first ``num_days`` days are meaningful.
+    """
+
+    def __init__(self, tasks_df, workers_df):
+        """
+        Create an empty cube for the tasks and workers in the given data frames, which are of the form described in the Project class docstring.
+        """
+        tasks_df = tasks_df.sort_values('task')
+        workers_df = workers_df.sort_values('worker')
+        self.tasks = pd.Index(tasks_df['task'].astype(str).values)
+        self.workers = pd.Index(workers_df['worker'].astype(str).values)
+        self.task_budgets = tasks_df['budget'].values.astype(float)
+        self.rates = workers_df['rate'].values.astype(float)
+        self.start = None
+        self.num_days = 0
+        self.shared = False
+        self.allocate(0)
+
+    def allocate(self, capacity, offset=0):
+        """
+        Reallocate the arrays of this cube to hold ``capacity`` days, copying the current data so that it begins ``offset`` days into the new arrays.
+        """
+        shape = (len(self.tasks), len(self.workers), capacity)
+        arrays = []
+        for name, dtype in [('duration', float), ('cost', float), 
+          ('count', np.int32)]:
+            new = np.zeros(shape, dtype=dtype)
+            if self.num_days:
+                new[:, :, offset:offset + self.num_days] =\
+                  getattr(self, name)[:, :, :self.num_days]
+            arrays.append(new)
+        self.duration, self.cost, self.count = arrays
+
+    def add(self, costs_df):
+        """
+        Add to this cube the rows of the given data frame, which should be of the form output by :func:`main.compute_costs`.
+        The cube grows as needed to cover the dates of the rows, and the cost of adding rows is proportional to their number except when the cube grows.
+        """
+        f = costs_df
+        if f.empty:
+            return
+        if self.shared:
+            self.allocate(self.duration.shape[2])
+            self.shared = False
+
+        i = ut.get_positions(f['task'], self.tasks)
+        j = ut.get_positions(f['worker'], self.workers)
+        if (i < 0).any() or (j < 0).any():
+            raise ValueError('Found tasks or workers not in the cube')
+
+        days = f['date'].values.astype('M8[D]')
+        first, last = days.min(), days.max()
+        if self.start is None:
+            self.start = first
+        offset = max(0, int((self.start - first)/np.timedelta64(1, 'D')))
+        num_days = max(self.num_days + offset, 
+          int((last - self.start)/np.timedelta64(1, 'D')) + offset + 1)
+        capacity = self.duration.shape[2]
+        if offset or num_days > capacity:
+            # Grow geometrically so that appending days is cheap
+            self.allocate(max(num_days, 2*capacity), offset=offset)
+            self.start -= np.timedelta64(offset, 'D')
+        self.num_days = num_days
+
+        d = ((days - self.start)/np.timedelta64(1, 'D')).astype(int)
+        np.add.at(self.duration, (i, j, d), f['duration'].values)
+        np.add.at(self.cost, (i, j, d), f['cost'].values)
+        np.add.at(self.count, (i, j, d), 1)
+
+    def copy(self):
+        """
+        Return a copy of this cube that shares its arrays with this cube, so that copying takes constant time.
+        Both cubes are marked as shared, so that whichever has rows added first copies its arrays then.
+        """
+        other = Cube.__new__(Cube)
+        other.__dict__.update(self.__dict__)
+        self.shared = other.shared = True
+        return other
+
+    def reprice(self, tasks_df=None, workers_df=None, rates_df=None):
+        """
+        Return a copy (see :meth:`copy`) of this cube with the task budgets of the given tasks data frame, if given, and with the costs recomputed from the durations of this cube and the rates of the given workers data frame and rate changes data frame, if the former is given.
+        The data frames are of the form described in the Project class docstring and must have the tasks and workers of this cube; raise a ``ValueError`` otherwise.
+
+        The duration and count arrays are always shared with this cube, and the cost array is too unless costs are recomputed, in which case each cost is its duration times the rate of its worker on its day, as in :func:`main.get_rates`.
+        """
+        other = self.copy()
+        if tasks_df is not None:
+            other.task_budgets = tasks_df.set_index('task')['budget']\
+              .reindex(self.tasks).values.astype(float)
+            if np.isnan(other.task_budgets).any():
+                raise ValueError('Found cube tasks not in the tasks data '\
+                  'frame')
+        if workers_df is None:
+            return other
+
+        other.rates = workers_df.set_index('worker')['rate']\
+          .reindex(self.workers).values.astype(float)
+        if np.isnan(other.rates).any():
+            raise ValueError('Found cube workers not in the workers data '\
+              'frame')
+        if rates_df is None or rates_df.empty or self.start is None:
+            rates = other.rates[None, :, None]
+        else:
+            # Find the rate of each worker on each day
+            num_workers, capacity = len(self.workers), self.cost.shape[2]
+            days = (self.start + np.arange(capacity)).astype('M8[ns]')
+            groups = np.repeat(np.arange(num_workers), capacity)
+            k = ut.get_asof_positions(groups, np.tile(days, num_workers),
+              ut.get_positions(rates_df['worker'], self.workers),
+              rates_df['effective_date'].values)
+            rates = np.where(k >= 0, rates_df['rate'].values[k], 
+              other.rates[groups]).reshape(num_workers, capacity)[None]
+        other.cost = self.duration*rates
+        return other
+
+    def get_days(self):
+        """
+        Return a DatetimeIndex of the days covered by this cube.
+        """
+        if self.start is None:
+            return pd.DatetimeIndex([])
+        return pd.DatetimeIndex((self.start + np.arange(self.num_days))\
+          .astype('M8[ns]'))
+
+    def get_day_bounds(self, start=None, end=None):
+        """
+        Return the pair of day positions (i, j) such that the cube days ``i`` up to but excluding ``j`` are those from ``start`` to ``end`` inclusive, where a ``None`` bound means no bound.
+        A day is in that range if its midnight is, so a ``start`` with a time of day excludes its own day, as in :meth:`window.DateIndex.get_rows` and :meth:`store.Store.get_where`.
+        The range is then narrowed to run from its first to its last day with rows, so that date periods grouped from day ``i`` start where those of the timesheet rows do, e.g. for tick frequencies such as ``'10D'``.
+        """
+        i, j = 0, self.num_days
+        if self.start is None:
+            return i, j
+        one_day = np.timedelta64(1, 'D')
+        if start is not None:
+            day = np.datetime64(pd.Timestamp(start).ceil('D').date(), 'D')
+            i = min(max(int((day - self.start)/one_day), 0), j)
+        if end is not None:
+            day = np.datetime64(pd.Timestamp(end).date(), 'D')
+            j = min(max(int((day - self.start)/one_day) + 1, i), j)
+
+        # Narrow to the days with rows
+        days = np.flatnonzero(self.count[:, :, i:j].any(axis=(0, 1)))
+        if not days.size:
+            return i, i
+        return i + days[0], i + days[-1] + 1
+
+    def aggregate(self, by_task=False, by_worker=False, freq=None, 
+      start=None, end=None):
+        """
+        Return a data frame of the same form as the output of :func:`main.aggregate_costs` for the timesheet rows added to this cube, restricted to the days from ``start`` to ``end`` inclusive if these are given.
+        Computed by summing the cube arrays along the axes not grouped by and, if ``freq`` is given, along runs of days in the same period.
+        The rate column holds effective rates, as given by :func:`utilities.get_effective_rates`, and the task budget column is filled only when grouping by task.
+        """
+        i, j = self.get_day_bounds(start, end)
+        arrays = [self.duration[:, :, i:j], self.cost[:, :, i:j], 
+          self.count[:, :, i:j]]
+        for axis, keep in [(1, by_worker), (0, by_task)]:
+            if not keep:
+                arrays = [a.sum(axis=axis, keepdims=True) for a in arrays]
+
+        if freq is None:
+            arrays = [a.sum(axis=2, keepdims=True) for a in arrays]
+        elif i == j:
+            labels = pd.DatetimeIndex([])
+        else:
+            labels, sizes = ut.get_periods(self.get_days()[i:j], freq)
+            starts = np.concatenate([[0], np.cumsum(sizes)[:-1]])
+            arrays = [np.add.reduceat(a, starts, axis=2) for a in arrays]
+
+        # Keep nonempty groups in date, task, worker order
+        duration, cost, count = [np.moveaxis(a, 2, 0) for a in arrays]
+        if freq is None and not by_task and not by_worker:
+            p, t, w = np.zeros((3, 1), dtype=int)
+        else:
+            p, t, w = np.nonzero(count)
+
+        g = pd.DataFrame()
+        if freq is not None:
+            g['date'] = labels[p]
+        if by_task:
+            g['task'] = pd.Categorical.from_codes(t, self.tasks)\
+              .remove_unused_categories()
+        if by_worker:
+            g['worker'] = pd.Categorical.from_codes(w, self.workers)\
+              .remove_unused_categories()
+        g['duration'] = duration[p, t, w]
+        g['rate'] = ut.get_effective_rates(cost[p, t, w], g['duration'])
+        g['cost'] = cost[p, t, w]
+        g['task_budget'] = self.task_budgets[t] if by_task else np.nan
+        return g
@@ -0,0 +1,171 @@
+"""
+This module implements deduplicating ingestion of timesheets, for Replicon exports that overlap, e.g. a weekly export and a monthly export covering some of the same days.
+
+Each timesheet entry is hashed to a 64-bit key from its date, task, worker, duration, and occurrence, that is, the number of identical entries before it in its file, so that identical entries within one export stay distinct while the same entry in two exports gets the same key.
+The keys of the ingested entries are kept in a persistent hash index (:class:`HashIndex`), and a new file is merged by looking up only its own keys in the index, so the cost of ingesting a file grows with the file and not with the history ingested before it.
+"""
+from pathlib import Path
+import hashlib
+import os
+import uuid
+
+import pandas as pd
+import numpy as np
+
+import project_reporter.utilities as ut
+import project_reporter.replicon as rp
+
+
+#: Odd 64-bit constant added to hashed values so that 0 does not hash to 0
+GOLDEN = np.uint64(0x9e3779b97f4a7c15)
+
+def mix(x):
+    """
+    Return the SplitMix64 finalizer applied to the given NumPy ``uint64`` array, a fast hash of 64-bit integers to 64-bit integers.
+    """
+    x = (x ^ (x >> np.uint64(30)))*np.uint64(0xbf58476d1ce4e5b9)
+    x = (x ^ (x >> np.uint64(27)))*np.uint64(0x94d049bb133111eb)
+    return x ^ (x >> np.uint64(31))
+
+def hash_strings(values):
+    """
+    Return a NumPy ``uint64`` array of stable hashes of the given string values, hashing each distinct value once with BLAKE2b.
+    """
+    codes, uniques = pd.factorize(np.asarray(values, dtype=object))
+    hashes = np.array([int.from_bytes(hashlib.blake2b(
+      str(x).encode('utf-8'), digest_size=8).digest(), 'little')
+      for x in uniques] + [0], dtype=np.uint64)
+    return hashes[codes]
+
+def get_occurrences(keys):
+    """
+    Return a NumPy integer array giving for each of the given keys the number of equal keys before it.
+    """
+    order = np.argsort(keys, kind='mergesort')
+    sorted_keys = keys[order]
+    n = len(keys)
+    starts = np.ones(n, dtype=bool)
+    starts[1:] = sorted_keys[1:] != sorted_keys[:-1]
+    run_starts = np.maximum.accumulate(np.where(starts, np.arange(n), 0))
+    occurrences = np.empty(n, dtype=np.int64)
+    occurrences[order] = np.arange(n) - run_starts
+    return occurrences
+
+def hash_timesheet(timesheet_df):
+    """
+    Return a NumPy ``uint64`` array of the keys of the entries of the given timesheet data frame, of the form described in the Project class docstring.
+    The key of an entry is a hash of its day, task, worker, duration, and occurrence in the timesheet, as explained in the module docstring.
+    """
+    f = timesheet_df
+    components = [
+      f['date'].values.astype('M8[D]').astype(np.int64).view(np.uint64),
+      hash_strings(f['task'].values),
+      hash_strings(f['worker'].values),
+      f['duration'].values.astype(np.float64).view(np.uint64),
+      ]
+    h = np.zeros(f.shape[0], dtype=np.uint64)
+    with np.errstate(over='ignore'):
+        for x in components:
+            h = mix(h ^ mix(x + GOLDEN))
+        occurrences = get_occurrences(h).view(np.uint64)
+        h = mix(h ^ mix(occurrences + GOLDEN))
+    return h
+
+class HashIndex(object):
+    """
+    This class encodes a persistent hash index, a set of 64-bit keys stored in a directory as sorted arrays of unique keys, called segments, in NumPy ``.npy`` files.
+    Each instance has the following properties.
+
+    - ``path``: Path of the directory
+    - ``names``: list of the file names of the segments, oldest first
+    - ``segments``: list of the segments, as read-only memory-mapped arrays, oldest first
+
+    Looking up keys takes one binary search per segment.
+    Adding keys writes them as a new segment and then merges the newest segments while the newest is at least half the size of the one before it, so that there are logarithmically many segments and each key is rewritten logarithmically many times.
+    """
+
+    def __init__(self, path):
+        """
+        Open the hash index at the given directory path, creating the directory if necessary.
+        """
+        self.path = Path(path)
+        self.path.mkdir(parents=True, exist_ok=True)
+        self.names = sorted(p.name for p in self.path.glob('segment_*.npy'))
+        self.segments = [np.load(str(self.path/name), mmap_mode='r')
+          for name in self.names]
+
+    def __len__(self):
+        return sum(len(s) for s in self.segments)
+
+    def contains(self, keys):
+        """
+        Return a NumPy boolean array indicating which of the given keys are in this index.
+        """
+        keys = np.asarray(keys, dtype=np.uint64)
+        found = np.zeros(len(keys), dtype=bool)
+        for segment in self.segments:
+            if not len(segment):
+                continue
+            i = np.minimum(np.searchsorted(segment, keys), len(segment) - 1)
+            found |= segment[i] == keys
+        return found
+
+    def write_segment(self, keys):
+        """
+        Write the given sorted unique keys as the newest segment of this index, atomically, and return its file name.
+        """
+        number = int(self.names[-1][8:-4]) + 1 if self.names else 0
+        name = 'segment_{:012d}.npy'.format(number)
+        tmp_path = self.path/'.{!s}.npy'.format(uuid.uuid4().hex)
+        np.save(str(tmp_path), keys)
+        os.replace(str(tmp_path), str(self.path/name))
+        self.names.append(name)
+        self.segments.append(np.load(str(self.path/name), mmap_mode='r'))
+        return name
+
+    def add(self, keys):
+        """
+        Add the given keys to this index.
+        """
+        keys = np.unique(np.asarray(keys, dtype=np.uint64))
+        if not len(keys):
+            return
+        self.write_segment(keys)
+
+        # Merge the newest segments
+        while len(self.segments) >= 2 and \
+          2*len(self.segments[-1]) >= len(self.segments[-2]):
+            old_names = self.names[-2:]
+            merged = np.union1d(self.segments[-2], self.segments[-1])
+            self.write_segment(merged)
+            del self.names[-3:-1], self.segments[-3:-1]
+            for name in old_names:
+                os.remove(str(self.path/name))
+
+def ingest_timesheet(timesheet_df, index, project=None):
+    """
+    Return the entries of the given timesheet data frame whose keys (see :func:`hash_timesheet`) are not in the given hash index (:class:`HashIndex` or directory path of one), and add their keys to the index.
+    If a project is given, then first append the new entries to it with :meth:`project.Project.append_timesheet`, so that the index only records entries the project accepted.
+    """
+    if not isinstance(index, HashIndex):
+        index = HashIndex(index)
+    keys = hash_timesheet(timesheet_df)
+    is_new = ~index.contains(keys)
+    f = timesheet_df[is_new]
+    if project is not None and not f.empty:
+        project.append_timesheet(f)
+    index.add(keys[is_new])
+    return f
+
+def ingest_replicons(paths, index, replicon_options=None, project=None):
+    """
+    Read and reformat the Replicon timesheets located at the given paths, given as in :func:`replicon.get_paths`, with :func:`replicon.read_replicon_file`, one after the other, and ingest each with :func:`ingest_timesheet` using the given hash index and project.
+    Return the concatenation of the new entries, with ``'task'`` and ``'worker'`` columns categorical as in :func:`utilities.concat_categoricals`.
+    """
+    if not isinstance(index, HashIndex):
+        index = HashIndex(index)
+    frames = []
+    for path in rp.get_paths(paths):
+        f = rp.read_replicon_file(path, replicon_options)
+        frames.append(ingest_timesheet(f, index, project=project))
+    return ut.concat_categoricals(frames, ['task', 'worker'])
@@ -0,0 +1,129 @@
+"""
+This module implements instrumentation of the reporting pipeline.
+The pipeline functions wrap their main steps in :class:`stage` context managers, and each completed stage produces a :class:`StageRecord` that is passed to every registered callback.
+When no callback is registered, a stage does nothing but check that, so the instrumentation costs next to nothing when disabled.
+
+The simplest way to collect records is with a :class:`Recorder`, e.g.::
+
+    with Recorder() as rec:
+        project = read_project(config_path, timesheet_path)
+        plot(project, freq='W')
+    print(rec.to_json())
+
+"""
+from collections import namedtuple
+import json
+import os
+import time
+import tracemalloc
+
+
+#: Functions called with each completed stage record
+CALLBACKS = []
+
+StageRecord = namedtuple('StageRecord', 
+  ['name', 'seconds', 'rows', 'memory_delta'])
+StageRecord.__doc__ = """
+Record of a completed stage: its name, wall time in seconds, number of rows processed (or ``None`` if not set), and change in allocated memory in bytes (or ``None`` if unavailable).
+"""
+
+def add_callback(callback):
+    """
+    Register the given function to be called with each completed :class:`StageRecord`.
+    """
+    CALLBACKS.append(callback)
+
+def remove_callback(callback):
+    """
+    Unregister the given function.
+    """
+    CALLBACKS.remove(callback)
+
+def get_memory():
+    """
+    Return the memory currently allocated by this process in bytes: the memory traced by :mod:`tracemalloc` if it is tracing, the resident set size if available, and ``None`` otherwise.
+    """
+    if tracemalloc.is_tracing():
+        return tracemalloc.get_traced_memory()[0]
+    try:
+        with open('/proc/self/statm') as src:
+            return int(src.read().split()[1])*os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        return None
+
+class stage(object):
+    """
+    Context manager that measures the block it wraps as the stage of the given name.
+    Set the attribute ``rows`` of the object returned on entry to record the number of rows processed.
+    The stage is measured only if there are callbacks on entry, and recorded only if there are still callbacks on exit.
+    """
+    __slots__ = ['name', 'rows', 'start', 'memory']
+
+    def __init__(self, name):
+        self.name = name
+        self.rows = None
+        self.start = None
+
+    def __enter__(self):
+        if CALLBACKS:
+            self.memory = get_memory()
+            self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        if CALLBACKS and exc_type is None and self.start is not None:
+            seconds = time.perf_counter() - self.start
+            memory = get_memory()
+            if memory is not None and self.memory is not None:
+                memory -= self.memory
+            else:
+                memory = None
+            record = StageRecord(self.name, seconds, self.rows, memory)
+            for callback in list(CALLBACKS):
+                callback(record)
+        return False
+
+class Recorder(object):
+    """
+    Context manager that collects the records of the stages completed within it in the list ``self.records``.
+    If ``trace_memory``, then trace memory allocations with :mod:`tracemalloc` while recording, which is more precise than the resident set size but slows the pipeline.
+    """
+    def __init__(self, trace_memory=False):
+        self.records = []
+        self.trace_memory = trace_memory
+
+    def __call__(self, record):
+        self.records.append(record)
+
+    def __enter__(self):
+        if self.trace_memory:
+            tracemalloc.start()
+        add_callback(self)
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        remove_callback(self)
+        if self.trace_memory:
+            tracemalloc.stop()
+        return False
+
+    def to_json(self):
+        """
+        Return the records as a JSON list of objects with the keys of :class:`StageRecord`.
+        """
+        return json.dumps([r._asdict() for r in self.records])
+
+    def to_statsd(self, prefix='project_reporter'):
+        """
+        Return the records as a list of statsd metric lines of the form ``'<prefix>.<stage>.seconds:<milliseconds>|ms'``, ``'<prefix>.<stage>.rows:<rows>|c'``, and ``'<prefix>.<stage>.memory_delta:<bytes>|g'``, omitting missing values.
+        """
+        lines = []
+        for r in self.records:
+            name = '{!s}.{!s}'.format(prefix, r.name)
+            lines.append('{!s}.seconds:{!r}|ms'.format(name, r.seconds*1000))
+            if r.rows is not None:
+                lines.append('{!s}.rows:{!s}|c'.format(name, r.rows))
+            if r.memory_delta is not None:
+                lines.append('{!s}.memory_delta:{!s}|g'.format(name, 
+                  r.memory_delta))
+        return lines
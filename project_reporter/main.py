@@ -4,26 +4,56 @@ from collections import OrderedDict
 
 import pandas as pd
 import numpy as np
-from highcharts import Highchart
-import colorlover as cl
-from xml.sax import ContentHandler, parse
 
 import project_reporter.utilities as ut 
 import project_reporter.constants as cs 
+import project_reporter.cube as cb
+import project_reporter.instrument as it
+import project_reporter.window as wn
 
               
-def compute_costs(project):
+def compute_costs(project, timesheet_df=None):
     """
+    Return a copy of the project timesheet, or of the given timesheet if ``timesheet_df`` is given, with the columns
+
+    - ``'task_budget'``: budget of the row's task
+    - ``'rate'``: rate of the row's worker on the row's date; see :func:`get_rates`
+    - ``'cost'``: duration times rate
+    - ``'cost/task_budget'``
+    - ``'cost/project_budget'``
+
+    appended and with the ``'task'`` and ``'worker'`` columns categorical.
+    The result for the project timesheet is memoized on the project; see :meth:`project.Project.memoize`.
+    If the project is compact, then the result is computed on demand instead, and a compact timesheet (see :func:`utilities.compact_timesheet`) is expanded first.
+    If the project has no timesheet but has a store, then the result for the timesheet in the store is computed there; see :meth:`store.Store.compute_costs`.
+    Budgets and rates are looked up by mapping tasks and workers to integer positions in ``project.tasks_df`` and ``project.workers_df`` and indexing NumPy arrays, so no join is done.
     """
-    if project.timesheet_df is None:
-        raise ValueError('The project needs a timesheet for this operation')
+    if timesheet_df is None:
+        if project.compact and project.timesheet_df is not None:
+            return compute_costs(project, project.timesheet_df)
+        if project.timesheet_df is None and project.store is not None:
+            return project.memoize(('compute_costs',), 
+              lambda: project.store.compute_costs(project.name, 
+              project.budget))
+        if project.timesheet_df is None:
+            raise ValueError(
+              'The project needs a timesheet for this operation')
+        return project.memoize(('compute_costs',), 
+          lambda: compute_costs(project, project.timesheet_df))
 
-    # Merge in billing rates and buget
-    f = project.timesheet_df.merge(project.tasks_df).merge(project.workers_df)
-    # Pandas bug: category dtypes not preserved.  So recreate them.
-    f['task'] = f['task'].astype('category')
-    f['worker'] = f['worker'].astype('category')
-    f = f.rename(columns={'budget': 'task_budget'})
+    f = ut.expand_timesheet(timesheet_df)
+    for col in ['task', 'worker']:
+        if not hasattr(f[col], 'cat'):
+            f[col] = f[col].astype('category')
+
+    # Look up budgets and rates
+    i = ut.get_positions(f['task'], project.tasks_df['task'])
+    j = ut.get_positions(f['worker'], project.workers_df['worker'])
+    if (i < 0).any() or (j < 0).any():
+        raise ValueError('The timesheet has tasks or workers not in '\
+          'the project config')
+    f['task_budget'] = project.tasks_df['budget'].values[i]
+    f['rate'] = get_rates(project, j, f['date'].values)
     
     # Compute cost
     f['cost'] = f['duration']*f['rate']
@@ -32,56 +62,324 @@ def compute_costs(project):
 
     return f
 
-def summarize(project, by_task=False, by_worker=False, freq=None):
+def get_rates(project, worker_positions, dates):
     """
-    """      
-    if project.timesheet_df is None:
-        raise ValueError('The project needs a timesheet for this operation')
+    Return a NumPy array of the rates of the workers at the given positions in ``project.workers_df`` on the given dates.
+    The rate of a worker on a date is the rate of the latest row of ``project.rates_df`` for the worker effective on or before that date, if any, and the worker's rate in ``project.workers_df`` otherwise.
+    The rate history is looked up for all the rows at once with :func:`utilities.get_asof_positions`.
+    """
+    rates = project.workers_df['rate'].values[worker_positions]
+    r = project.rates_df
+    if r is None or r.empty:
+        return rates
 
-    def my_agg(group):
-        d = OrderedDict()
-        d['duration'] = group['duration'].sum()
-        d['rate'] = group['rate'].iat[0]
-        d['cost'] = group['cost'].sum()
-        d['task_budget'] = group['task_budget'].iat[0]
-        return pd.Series(d)
-    
-    f = compute_costs(project)
+    k = ut.get_asof_positions(worker_positions, dates, 
+      ut.get_positions(r['worker'], project.workers_df['worker']), 
+      r['effective_date'].values)
+    return np.where(k >= 0, r['rate'].values[k], rates)
+
+def aggregate_costs(f, by_task=False, by_worker=False, freq=None):
+    """
+    Given a data frame of the form output by :func:`compute_costs`, group it by date period (if ``freq`` is given), by task (if ``by_task``), and by worker (if ``by_worker``), in that order.
+    Return a data frame with the group columns followed by the columns
+
+    - ``'duration'``: sum of durations in the group
+    - ``'rate'``: effective rate of the group, that is, its cost divided by its duration, or NaN if its duration is 0
+    - ``'cost'``: sum of costs in the group
+    - ``'task_budget'``: first task budget in the group
+
+    Groups are sorted and only nonempty groups are kept.
+    The grouping is done on the integer codes of the categorical task and worker columns in one vectorized pass, so it scales linearly with the number of rows.
+    """
+    agg = OrderedDict([
+        ('duration', 'sum'),
+        ('cost', 'sum'),
+        ('task_budget', 'first'),
+        ])
     cols = []
     if by_task:
         cols.append('task')
     if by_worker:
         cols.append('worker')
+
+    if freq is None and not cols:
+        g = pd.DataFrame([[
+          f['duration'].sum(), 
+          f['cost'].sum(), 
+          f['task_budget'].iat[0] if f.shape[0] else np.nan,
+          ]], columns=list(agg))
+    else:
+        # Group on category codes to avoid forming unobserved combinations
+        h = f[['date'] + list(agg)].copy()
+        for col in cols:
+            h[col] = f[col].cat.codes
+        keys = list(cols)
+        if freq is not None:
+            keys.insert(0, pd.Grouper(key='date', freq=freq, label='left'))
+        groups = h.groupby(keys, sort=True)
+        g = groups.agg(agg)[list(agg)]
+
+        # Drop empty date periods
+        g = g[groups.size() > 0].reset_index()
+
+        for col in cols:
+            g[col] = pd.Categorical.from_codes(g[col].values, 
+              f[col].cat.categories)
+
+    g.insert(g.columns.get_loc('duration') + 1, 'rate', 
+      ut.get_effective_rates(g['cost'], g['duration']))
+    return g
+
+def build_cube(project):
+    """
+    Build a cost cube (:class:`cube.Cube`) from the costs of the given project, set it as the attribute ``project.cube``, and return it.
+    While the project has a cube, :func:`summarize` and hence :func:`plot` compute their results from the cube instead of from the timesheet, so build the cube again after changing the project.
+    """
+    if project.timesheet_df is None and project.store is None:
+        raise ValueError('The project needs a timesheet for this operation')
+
+    cube = cb.Cube(project.tasks_df, project.workers_df)
+    cube.add(compute_costs(project))
+    project.cube = cube
+    return cube
+
+def get_date_index(project):
+    """
+    Return the date index (:class:`window.DateIndex`) of the costs of the given project, memoized on the project.
+    """
+    def compute():
+        f = project.memoize(('compute_costs',), 
+          lambda: compute_costs(project, project.timesheet_df), copy=False)
+        return wn.DateIndex(f)
+
+    return project.memoize(('date_index',), compute, copy=False)
+
+def get_window_totals(project, start=None, end=None):
+    """
+    Return a dictionary with the keys ``'duration'``, ``'cost'``, and ``'cost/project_budget'`` giving the totals of the given project for the dates from ``start`` to ``end`` inclusive, where a ``None`` bound means no bound.
+    Computed in logarithmic time from the project date index; see :func:`get_date_index`.
+    """
+    if project.timesheet_df is None or project.compact:
+        g = summarize(project, start=start, end=end)
+        duration, cost = g['duration'].iat[0], g['cost'].iat[0]
+    else:
+        duration, cost = get_date_index(project).get_totals(start, end)
+    return OrderedDict([
+      ('duration', duration),
+      ('cost', cost),
+      ('cost/project_budget', cost/project.budget),
+      ])
+
+def summarize(project, by_task=False, by_worker=False, freq=None, 
+  start=None, end=None):
+    """
+    Summarize the costs of the given project, grouped by date period (if ``freq`` is given), by task (if ``by_task``), and by worker (if ``by_worker``), computing them from the project cube if the project has one, in SQLite if the project has a store instead of a timesheet (see :meth:`store.Store.aggregate`), and from the project timesheet otherwise.
+    If ``start`` or ``end`` is given, then restrict the summary to the dates from ``start`` to ``end`` inclusive; the rows in that window are found with the project date index (see :func:`get_date_index`) and no others are touched.
+    If the project is compact, then the costs and date index are built for the call and not kept, so that only the result is.
+    The result is memoized on the project under the key ``('summarize', by_task, by_worker, freq, start, end)``; see :meth:`project.Project.memoize`.
+    """      
+    start = None if start is None else pd.Timestamp(start)
+    end = None if end is None else pd.Timestamp(end)
+
+    def compute():
+        if project.cube is not None:
+            with it.stage('aggregate_cube') as s:
+                g = project.cube.aggregate(by_task=by_task, 
+                  by_worker=by_worker, freq=freq, start=start, end=end)
+                s.rows = g.shape[0]
+        elif project.timesheet_df is None and project.store is not None:
+            with it.stage('aggregate_store') as s:
+                g = project.store.aggregate(project.name, by_task=by_task,
+                  by_worker=by_worker, freq=freq, start=start, end=end)
+                s.rows = g.shape[0]
+        elif project.timesheet_df is None:
+            raise ValueError(
+              'The project needs a timesheet for this operation')
+        else:
+            with it.stage('compute_costs') as s:
+                if project.compact:
+                    f = compute_costs(project)
+                    index = wn.DateIndex(f)
+                else:
+                    f = project.memoize(('compute_costs',), 
+                      lambda: compute_costs(project, project.timesheet_df), 
+                      copy=False)
+                    index = get_date_index(project)
+                if start is not None or end is not None:
+                    f = index.get_rows(f, start, end)
+                s.rows = f.shape[0]
+            with it.stage('aggregate') as s:
+                g = aggregate_costs(f, by_task=by_task, 
+                  by_worker=by_worker, freq=freq)
+                s.rows = f.shape[0]
+            
+        # Append or drop some columns
+        if by_task:
+            g['cost/task_budget'] = g['cost']/g['task_budget']
+            g['cost/project_budget'] = g['cost']/project.budget
+        else:
+            g = g.drop(['task_budget'], axis=1)
+            g['cost/project_budget'] = g['cost']/project.budget
+        if not by_worker:
+            g = g.drop(['rate'], axis=1)
+        return g
+
+    key = ('summarize', by_task, by_worker, freq, start, end)
+    return project.memoize(key, compute)
+
+def build_chart_data(f, freq=None):
+    """
+    Given a data frame of the form output by ``summarize(project, by_task=True, by_worker=True, freq=freq)``, return the data for the columns of the chart made by :func:`plot` as a pair of lists:
+
+    - ``series``: list of pairs (task, data) for the task columns, where data is a list of dictionaries, one per date period (or one only if ``freq`` is ``None``), with the keys ``'name'``, ``'y'``, and ``'drilldown'``
+    - ``drilldowns``: list of triples (task, drilldown ID, data) for the worker drilldowns of the task columns, where data is a list of pairs (worker, value)
+
+    The values plotted are those of the ``'cost/project_budget'`` column, summed by task and date period.
+    Computed from one sort of the data frame by task and date, with the dates formatted all at once, and without grouping it.
+    """
+    if f.empty:
+        return [], []
+
+    task_codes = f['task'].cat.codes.values
     if freq is None:
-        if cols:
-            g = f.groupby(cols).apply(my_agg).reset_index()
+        order = np.argsort(task_codes, kind='mergesort')
+        change = np.diff(task_codes[order]) != 0
+    else:
+        dates = f['date'].values
+        order = np.lexsort((dates, task_codes))
+        change = (np.diff(task_codes[order]) != 0) |\
+          (dates[order][1:] != dates[order][:-1])
+    starts = np.concatenate([[0], np.flatnonzero(change) + 1])
+    ends = np.concatenate([starts[1:], [len(order)]])
+
+    f = f.iloc[order]
+    tasks = np.asarray(f['task'].values, dtype=object)[starts].tolist()
+    totals = np.add.reduceat(f['cost/project_budget'].values, starts)\
+      .tolist()
+    pairs = f[['worker', 'cost/project_budget']].values.tolist()
+    if freq is None:
+        names = ['Project to date']*len(starts)
+        drilldown_ids = tasks
+    else:
+        names = f['date'].dt.strftime('%Y-%m-%d').values[starts].tolist()
+        drilldown_ids = ['{!s}-{!s}'.format(task, name) 
+          for task, name in zip(tasks, names)]
+
+    series = []
+    drilldowns = []
+    for k, task in enumerate(tasks):
+        point = {
+          'name': names[k],
+          'y': totals[k],
+          'drilldown': drilldown_ids[k],
+          }
+        if k and task == tasks[k - 1]:
+            series[-1][1].append(point)
         else:
-            s = my_agg(f)
-            g = pd.DataFrame([s.values], columns=s.index)
+            series.append((task, [point]))
+        drilldowns.append((task, drilldown_ids[k], 
+          pairs[starts[k]:ends[k]]))
+
+    return series, drilldowns
+
+def forecast_costs(project, freq='W', window=4, by_task=False, 
+  start=None, end=None):
+    """
+    Forecast when the given project, or each of its tasks if ``by_task``, will exhaust its budget, from its costs summarized with the given frequency (and optional date window) by :func:`summarize`.
+    Return a data frame with a row for every date period from the first to the last with costs (and, if ``by_task``, every task), in date (and task) order, with the columns
+
+    - ``'date'``: label of the period
+    - ``'task'``: if ``by_task``
+    - ``'cost'``: cost in the period
+    - ``'cumulative_cost'``: cost up to and including the period
+    - ``'budget'``: task budget if ``by_task`` and project budget otherwise
+    - ``'burn_rate'``: mean cost per period over the last ``window`` periods up to and including the period
+    - ``'exhaustion_date'``: day on which the cumulative cost reached the budget, if it did by the end of the period; otherwise the date the budget would be exhausted if spending continued at the burn rate from the end of the period, or ``NaT`` if the burn rate is zero
+
+    Computed for all periods and tasks at once from a period by task matrix of costs, and from the daily costs for the days on which budgets were reached.
+    A period ends where the next one begins, which for frequencies closed on the right, such as ``'W'``, is a day after the label of the next period, since the day of that label belongs to this period.
+    """
+    g = summarize(project, by_task=by_task, freq=freq, start=start, end=end)
+    if g.empty:
+        return pd.DataFrame(columns=['date'] + ['task']*by_task + ['cost', 
+          'cumulative_cost', 'budget', 'burn_rate', 'exhaustion_date'])
+
+    # Build a matrix of costs by period and task, with empty periods
+    first, last = g['date'].min(), g['date'].max()
+    bounds = pd.date_range(first, periods=
+      len(pd.date_range(first, last, freq=freq)) + 1, freq=freq)
+    dates = bounds[:-1]
+    if by_task:
+        tasks = g['task'].cat.categories
+        budgets = project.tasks_df.set_index('task')['budget']\
+          .reindex(tasks).values
+        costs = g.pivot_table(index='date', columns='task', values='cost',
+          aggfunc='sum').reindex(index=dates, columns=tasks).fillna(0)
+        costs = costs.values
     else:
-        cols.insert(0, pd.TimeGrouper(freq, label='left'))
-        g = f.set_index('date').groupby(cols).apply(my_agg).reset_index()
-            
-    # Append or drop some columns
+        budgets = np.array([project.budget])
+        costs = g.set_index('date')['cost'].reindex(dates).fillna(0)\
+          .values[:, None]
+
+    cum_costs = costs.cumsum(axis=0)
+    burn_rates = pd.DataFrame(costs).rolling(window, min_periods=1).mean()\
+      .values
+
+    # Find the period ends, shifting them a day for right-closed periods
+    labels, __ = ut.get_periods(bounds[1:2], freq)
+    ends = bounds[1:] + pd.Timedelta(days=int(labels[0] == bounds[0]))
+    ends = ends.values.astype('M8[ns]')[:, None]
+
+    # Find the days on which budgets were reached, from daily costs
+    d = summarize(project, by_task=by_task, freq='D', start=start, end=end)
     if by_task:
-        g['cost/task_budget'] = g['cost']/g['task_budget']
-        g['cost/project_budget'] = g['cost']/project.budget
+        daily = d.pivot_table(index='date', columns='task', values='cost',
+          aggfunc='sum').reindex(columns=tasks).fillna(0)
     else:
-        g = g.drop(['task_budget'], axis=1)
-        g['cost/project_budget'] = g['cost']/project.budget
-    if not by_worker:
-        g = g.drop(['rate'], axis=1)
-    return g
+        daily = d.set_index('date')[['cost']]
+    reached = daily.values.cumsum(axis=0) >= budgets
+    past = np.where(reached.any(axis=0), 
+      daily.index.values.astype('M8[ns]')[reached.argmax(axis=0)], 
+      np.datetime64('NaT'))
+    exhausted = past < ends
 
-def plot(project, freq=None):
-    """
+    # Project exhaustion dates of the others from period ends
+    with np.errstate(divide='ignore', invalid='ignore'):
+        periods_left = (budgets - cum_costs)/burn_rates
+    steps = np.diff(bounds.values).astype('m8[ns]').astype(float)[:, None]
+    projected = ends.astype(float) + periods_left*steps
+    projected[~np.isfinite(projected)] = np.nan
+    projected = pd.to_datetime(projected.ravel()).values.reshape(
+      projected.shape)
+    exhaustion_dates = np.where(exhausted, past[None, :], projected)
+
+    n, k = costs.shape
+    f = pd.DataFrame()
+    f['date'] = np.repeat(dates.values, k)
+    if by_task:
+        f['task'] = pd.Categorical.from_codes(np.tile(np.arange(k), n), 
+          tasks)
+    f['cost'] = costs.ravel()
+    f['cumulative_cost'] = cum_costs.ravel()
+    f['budget'] = np.tile(budgets, n)
+    f['burn_rate'] = burn_rates.ravel()
+    f['exhaustion_date'] = exhaustion_dates.ravel()
+    return f
+
+def plot(project, freq=None, start=None, end=None, forecast=False, 
+  window=4):
     """
-    if project.timesheet_df is None:
-        raise ValueError('The project needs a timesheet for this operation')
+    Plot the costs of the given project as a Highcharts stacked column chart, with a column for each date period (if ``freq`` is given) and with a stack for each task, each with a worker drilldown.
+    If ``start`` or ``end`` is given, then plot only the dates from ``start`` to ``end`` inclusive.
 
-    f = summarize(project, by_task=True, by_worker=True, freq=freq)
+    If ``forecast`` and ``freq`` is given, then also plot a line of the cumulative project cost and a dashed line projecting it forward at the project burn rate over the last ``window`` periods (see :func:`forecast_costs`) until it reaches the budget, for at most as many periods as are plotted.
+    """
+    f = summarize(project, by_task=True, by_worker=True, freq=freq, 
+      start=start, end=end)
     f['cost/project_budget'] *= 100 # For percentages
 
+    from highcharts import Highchart
+
     chart = Highchart()
     colors = ut.get_colors(0.8)
     options = {
@@ -139,37 +437,37 @@ def plot(project, freq=None):
     }
     chart.set_dict_options(options)        
     
-    if freq is None:            
-        # Add tasks with worker drilldown
-        for task, g in f.groupby('task'):
-            drilldown_id = task
-            series = [{
-              'name': 'Project to date',
-              'y': g['cost/project_budget'].sum(),
-              'drilldown': drilldown_id,
-              }]
-            chart.add_drilldown_data_set(
-              g[['worker', 'cost/project_budget']].values.tolist(), 
-              'column', name=task, id=drilldown_id)    
-            chart.add_data_set(series, 'column', name=task)
-    else:            
-        # Convert dates to strings
-        f['date'] = f['date'].map(lambda x: x.strftime('%Y-%m-%d'))
-
-        # Add tasks with worker drilldown
-        for task, g in f.groupby('task'):
-            series = []
-            for date, gg in g.groupby('date'):
-                drilldown_id = '{!s}-{!s}'.format(task, date)
-                series.append({
-                  'name': date,
-                  'y': gg['cost/project_budget'].sum(),
-                  'drilldown': drilldown_id,
-                  })     
-                chart.add_drilldown_data_set(
-                  gg[['worker', 'cost/project_budget']].values.tolist(), 
-                  'column', name=task, id=drilldown_id)
-            chart.add_data_set(series, 'column', name=task)
+    # Add tasks with worker drilldown
+    with it.stage('build_chart') as s:
+        series, drilldowns = build_chart_data(f, freq=freq)
+        for task, drilldown_id, data in drilldowns:
+            chart.add_drilldown_data_set(data, 'column', name=task, 
+              id=drilldown_id)
+        for task, data in series:
+            chart.add_data_set(data, 'column', name=task)
+        s.rows = f.shape[0]
+
+    if forecast and freq is not None and not f.empty:
+        with it.stage('build_forecast'):
+            fc = forecast_costs(project, freq=freq, window=window, 
+              start=start, end=end)
+            names = fc['date'].dt.strftime('%Y-%m-%d').tolist()
+            percents = (100*fc['cumulative_cost']/project.budget).tolist()
+            chart.add_data_set([{'name': n, 'y': y} 
+              for n, y in zip(names, percents)], 'line', 
+              name='Cumulative cost')
+
+            # Project the last cumulative cost forward
+            rate = 100*fc['burn_rate'].iat[-1]/project.budget
+            periods = 0
+            if rate > 0 and percents[-1] < 100:
+                periods = min(int(np.ceil((100 - percents[-1])/rate)), 
+                  len(names))
+            dates = pd.date_range(fc['date'].iat[-1], periods=periods + 1, 
+              freq=freq)
+            chart.add_data_set([{'name': d.strftime('%Y-%m-%d'), 
+              'y': percents[-1] + i*rate} for i, d in enumerate(dates)], 
+              'line', name='Projected cost', dashStyle='Dash')
             
     return chart
 
@@ -179,6 +477,8 @@ def plot_bak(project, freq=None):
     f = summarize(project, by_task=True, freq=freq)
     f['cost/project_budget'] *= 100  # For percentages
 
+    from highcharts import Highchart
+
     chart = Highchart()
     colors = ut.get_colors(0.8)
     options = {
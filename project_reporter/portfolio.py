@@ -0,0 +1,180 @@
+"""
+This module implements batch reporting over a portfolio of projects.
+Each project is given by a pair of paths (config path, timesheet path), and the projects are read, checked, summarized, and plotted in parallel worker processes.
+
+Can also be run from the command line; see :func:`run_cli`.
+"""
+from pathlib import Path
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+import argparse
+import sys
+import traceback
+
+import pandas as pd
+
+import project_reporter.project as pj
+import project_reporter.main as mn
+
+
+#: Columns of the portfolio summary data frame
+SUMMARY_COLS = [
+  'config_path',
+  'timesheet_path',
+  'name',
+  'client',
+  'currency',
+  'budget',
+  'duration',
+  'cost',
+  'cost/project_budget',
+  'chart_path',
+  'error',
+  ]
+
+def find_pairs(config_pattern):
+    """
+    Return a list of the pairs (config path, timesheet path) of the project configuration files matching the given glob pattern, e.g. ``'data/*_config.yaml'``.
+    The timesheet of a configuration file is the file in the same directory with the same name except with ``'config'`` replaced by ``'timesheet'`` and any suffix; if there is no such file, the timesheet path is ``None``.
+    """
+    pattern = Path(config_pattern)
+    pairs = []
+    for config_path in sorted(pattern.parent.glob(pattern.name)):
+        stem = config_path.stem.replace('config', 'timesheet')
+        timesheets = sorted(config_path.parent.glob(stem + '.*'))
+        pairs.append((config_path, timesheets[0] if timesheets else None))
+    return pairs
+
+def parse_pairs(args):
+    """
+    Return the list of the pairs (config path, timesheet path) given by the given command line arguments, each of which is either a pair of paths ``'config:timesheet'``, where an empty timesheet path means ``None``, or a glob pattern of configuration files, whose pairs are found with :func:`find_pairs`.
+    """
+    pairs = []
+    for arg in args:
+        if ':' in arg:
+            config_path, timesheet_path = arg.split(':', 1)
+            pairs.append((config_path, timesheet_path or None))
+        else:
+            pairs.extend(find_pairs(arg))
+    return pairs
+
+def report_project(config_path, timesheet_path=None, freq=None, 
+  output_dir=None, replicon_options=None, cache_dir=None):
+    """
+    Read the project with the given config and timesheet paths via :func:`project.read_project`, and summarize it by task with the given frequency.
+    If an output directory is given, write the summary there as a CSV file and, if the project has a timesheet, write the chart from :func:`main.plot` there as an HTML file, both named after the config file.
+
+    Return a dictionary with the keys
+
+    - ``'summary'``: the summary data frame or ``None`` if the project has no timesheet
+    - ``'totals'``: dictionary of the keys in :const:`SUMMARY_COLS` for the project
+    """
+    project = pj.read_project(config_path, timesheet_path, 
+      replicon_options=replicon_options, cache_dir=cache_dir)
+    totals = OrderedDict([
+      ('config_path', str(config_path)),
+      ('timesheet_path', str(timesheet_path) if timesheet_path else None),
+      ('name', project.name),
+      ('client', project.client),
+      ('currency', project.currency),
+      ('budget', project.budget),
+      ('duration', 0.0),
+      ('cost', 0.0),
+      ('cost/project_budget', 0.0),
+      ('chart_path', None),
+      ('error', None),
+      ])
+    if project.timesheet_df is None:
+        return {'summary': None, 'totals': totals}
+
+    summary = mn.summarize(project, by_task=True, freq=freq)
+    for key in ['duration', 'cost', 'cost/project_budget']:
+        totals[key] = summary[key].sum()
+
+    if output_dir is not None:
+        output_dir = Path(output_dir)
+        output_dir.mkdir(parents=True, exist_ok=True)
+        stem = Path(config_path).stem
+        summary.to_csv(str(output_dir/(stem + '_summary.csv')), 
+          index=False)
+        chart = mn.plot(project, freq=freq)
+        chart.save_file(str(output_dir/stem))
+        totals['chart_path'] = str(output_dir/(stem + '.html'))
+
+    return {'summary': summary, 'totals': totals}
+
+def run_portfolio(pairs, freq=None, output_dir=None, replicon_options=None,
+  cache_dir=None, processes=None):
+    """
+    Run :func:`report_project` with the given options on each of the given (config path, timesheet path) pairs, or on the pairs found by :func:`find_pairs` if ``pairs`` is a glob pattern string, spread across ``processes`` worker processes (defaults to the number of CPUs).
+
+    Return a pair ``(summary_df, results)``, where ``results`` is the list of outputs of :func:`report_project`, in the order of the pairs, and ``summary_df`` is a data frame with the columns :const:`SUMMARY_COLS` and one row per project.
+    A project that fails to be reported gets the output ``None`` and a summary row with the error traceback in the ``'error'`` column; the other projects are unaffected.
+    """
+    if isinstance(pairs, str):
+        pairs = find_pairs(pairs)
+
+    kwargs = {
+      'freq': freq,
+      'output_dir': output_dir,
+      'replicon_options': replicon_options,
+      'cache_dir': cache_dir,
+      }
+    results = []
+    rows = []
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        futures = [executor.submit(report_project, c, t, **kwargs) 
+          for c, t in pairs]
+        for (config_path, timesheet_path), future in zip(pairs, futures):
+            try:
+                result = future.result()
+                row = result['totals']
+            except Exception:
+                result = None
+                row = {
+                  'config_path': str(config_path),
+                  'timesheet_path': str(timesheet_path) 
+                    if timesheet_path else None,
+                  'error': traceback.format_exc(),
+                  }
+            results.append(result)
+            rows.append(row)
+
+    summary_df = pd.DataFrame(rows, columns=SUMMARY_COLS)
+    return summary_df, results
+
+def run_cli(argv=None):
+    """
+    Command line interface to :func:`run_portfolio`.
+    Write the portfolio summary as CSV to the output directory, if given, and to standard output otherwise.
+    Return 1 if any project failed and 0 otherwise.
+    """
+    parser = argparse.ArgumentParser(
+      description='Report on a portfolio of projects in parallel')
+    parser.add_argument('configs', nargs='+', 
+      help='config file glob patterns or config:timesheet path pairs')
+    parser.add_argument('--freq', default=None, 
+      help='Pandas frequency string for the summaries and charts')
+    parser.add_argument('--output-dir', default=None,
+      help='directory to write summaries and charts to')
+    parser.add_argument('--cache-dir', default=None,
+      help='directory to cache parsed timesheets in')
+    parser.add_argument('--processes', type=int, default=None,
+      help='number of worker processes')
+    args = parser.parse_args(argv)
+
+    summary_df, __ = run_portfolio(parse_pairs(args.configs), freq=args.freq, 
+      output_dir=args.output_dir, cache_dir=args.cache_dir, 
+      processes=args.processes)
+
+    if args.output_dir is not None:
+        path = Path(args.output_dir)/'portfolio_summary.csv'
+        path.parent.mkdir(parents=True, exist_ok=True)
+        summary_df.to_csv(str(path), index=False)
+    else:
+        summary_df.to_csv(sys.stdout, index=False)
+
+    return int(summary_df['error'].notnull().any())
+
+if __name__ == '__main__':
+    sys.exit(run_cli())
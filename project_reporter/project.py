@@ -7,16 +7,24 @@ CONVENTIONS:
 
 """
 from pathlib import Path
+from collections import OrderedDict
+import json
+import os
+import shutil
+import uuid
 
 import voluptuous as vt
-import magic
 import yaml
 import pandas as pd
 import numpy as np
 
 import project_reporter.constants as cs 
 import project_reporter.utilities as ut
-import project_reporter.replicon as rp 
+import project_reporter.cache as ch
+import project_reporter.cube as cb
+import project_reporter.store as st
+import project_reporter.instrument as it
+import project_reporter.main as mn
 
 
 class Project(object):
@@ -40,6 +48,13 @@ class Project(object):
         * ``'worker'``: string; name of the project worker 
         * ``'rate'``: positive float; hourly rate of the worker
 
+    - ``'rates_df'`` (optional): data frame of rate changes; defaults to ``None``; should contain the columns
+
+        * ``'worker'``: string; name of a project worker
+        * ``'effective_date'``: datetime object; date from which the rate applies
+        * ``'rate'``: positive float; hourly rate of the worker from that date until the worker's next effective date
+
+      A worker's rate in ``workers_df`` applies before the worker's first effective date; see :func:`main.get_rates`
     - ``'timesheet_df'`` (optional): data frame; defaults to ``None``; should contain the columns
 
         * ``'date'``: datetime object; date work was done
@@ -47,27 +62,173 @@ class Project(object):
         * ``'worker'``: project worker 
         * ``'duration'``: duration in hours of the work
 
+    - ``'cube'``: cost cube of the timesheet (:class:`cube.Cube`) or ``None``; defaults to ``None`` and is set by :func:`main.build_cube`
+
+    - ``'store'``: project store (:class:`store.Store`) holding the timesheet of the project, under its name, or ``None``; defaults to ``None`` and is set by :func:`read_store_project`
+
+    - ``'memo'``: OrderedDict of results computed from the above, such as the outputs of :func:`main.compute_costs` and :func:`main.summarize`; see :meth:`memoize`
+    - ``'max_memo_size'``: integer; maximum number of results in the memo; defaults to :const:`constants.MAX_MEMO_SIZE`
+
+    - ``'compact'``: boolean; defaults to ``False``; if ``True``, then the timesheet is stored in the compact form of :func:`utilities.compact_timesheet`, and the costs of its rows are computed on demand instead of memoized; see :func:`main.compute_costs`
+
+    Rows added with :meth:`append_timesheet` are kept as separate pieces and concatenated into ``timesheet_df`` only when that attribute is next accessed.
+    A piece can also be a function of no arguments returning a data frame, which is called then too; see :func:`read_snapshot`.
     """
 
     def __init__(self, name, description, client, budget, currency, 
-      tasks_df, workers_df, timesheet_df=None):
+      tasks_df, workers_df, timesheet_df=None, rates_df=None, 
+      validate=True, compact=False):
+        """
+        Check the given attributes, unless not ``validate``, which is only for attributes already checked, and set them.
+        """
+        if validate:
+            name = check_str(name)
+            description = check_str(description)
+            client = check_str(client)
+            budget = check_pos(budget)                       
+            currency = check_str(currency)
+            tasks_df = check_tasks_df(tasks_df, budget)
+            workers_df = check_workers_df(workers_df)
+            rates_df = check_rates_df(rates_df, workers_df)
+            timesheet_df = check_timesheet_df(timesheet_df, tasks_df,
+              workers_df)
+
+        self.memo = OrderedDict()
+        self.max_memo_size = cs.MAX_MEMO_SIZE
+        self.cube = None
+        self.store = None
+        self.compact = compact
+        self.name = name
+        self.description = description
+        self.client = client
+        self.budget = budget
+        self.currency = currency
+        self.tasks_df = tasks_df
+        self.workers_df = workers_df
+        self.rates_df = rates_df
+        self.timesheet_df = timesheet_df
+
+    def set_input(self, attr, value):
+        """
+        Set the given attribute, one that results depend on, to the given value and invalidate the results derived from the old value: clear the memo and drop the cube, unless the attribute is the budget, which the cube does not depend on.
+        If the project has no timesheet rows to rebuild the cube from, e.g. because it was streamed (see :func:`read_project`), then reprice the cube with :meth:`cube.Cube.reprice` instead of dropping it.
+        """
+        cube = self.cube
+        if cube is None or attr == 'budget':
+            pass
+        elif attr == 'timesheet_chunks' or self._timesheet_chunks:
+            cube = None
+        elif attr == 'tasks_df':
+            cube = cube.reprice(tasks_df=value)
+        else:
+            frames = {'workers_df': self.workers_df, 
+              'rates_df': self.rates_df}
+            frames[attr] = value
+            cube = cube.reprice(**frames)
+        setattr(self, '_' + attr, value)
+        self.clear_memo()
+        self.cube = cube
+
+    budget = property(lambda self: self._budget, 
+      lambda self, value: self.set_input('budget', value))
+    tasks_df = property(lambda self: self._tasks_df, 
+      lambda self, value: self.set_input('tasks_df', value))
+    workers_df = property(lambda self: self._workers_df, 
+      lambda self, value: self.set_input('workers_df', value))
+    rates_df = property(lambda self: self._rates_df, 
+      lambda self, value: self.set_input('rates_df', value))
+
+    @property
+    def timesheet_df(self):
+        chunks = self._timesheet_chunks
+        if not chunks:
+            return None
+        if any(callable(c) for c in chunks):
+            chunks = [c() if callable(c) else c for c in chunks]
+            self._timesheet_chunks = chunks
+        if len(chunks) > 1:
+            self._timesheet_chunks = [ut.concat_categoricals(chunks, 
+              ['task', 'worker'])]
+        return self._timesheet_chunks[0]
+
+    @timesheet_df.setter
+    def timesheet_df(self, f):
+        if f is not None and self.compact:
+            f = ut.compact_timesheet(f)
+        self.set_input('timesheet_chunks', [] if f is None else [f])
+
+    def clear_memo(self):
+        """
+        Clear the memo of results of this project.
+        Done automatically when the budget, tasks, workers, or timesheet of the project are set or appended to, but must be done by hand after changing them in place.
+        """
+        self.memo.clear()
+
+    def memoize(self, key, func, copy=True):
+        """
+        Return the value of ``func()``, looked up under the given key in the memo of this project if present there, and computed and stored there otherwise.
+        The memo holds at most ``self.max_memo_size`` values, evicting the least recently used ones.
+        If ``copy``, then return a copy of the value, so that the caller cannot change the stored value.
+        """
+        memo = self.memo
+        if key in memo:
+            memo.move_to_end(key)
+            value = memo[key]
+        else:
+            value = func()
+            memo[key] = value
+            while len(memo) > self.max_memo_size:
+                memo.popitem(last=False)
+        if copy:
+            value = value.copy()
+        return value
+
+    def append_timesheet(self, timesheet_df, keep_rows=True):
+        """
+        Append the rows of the given timesheet data frame to the timesheet of this project.
+        Check only the new rows against the tasks and workers of this project, and if this project has a cube, add the costs of the new rows to it, so that later summaries include them without rescanning the earlier rows.
+        The work done is proportional to the number of new rows.
+
+        If not ``keep_rows``, then only add the rows to the cube, which this project must then have, and leave the timesheet as is.
+        If this project has a store, then add the rows to the store instead of keeping them.
         """
+        f = check_timesheet_df(timesheet_df, self.tasks_df, 
+          self.workers_df)
+        if self.cube is not None:
+            self.cube.add(mn.compute_costs(self, timesheet_df=f))
+        elif not keep_rows:
+            raise ValueError('The project needs a cube for this operation')
+        if self.store is not None:
+            self.store.append_timesheet(self.name, f)
+        elif keep_rows:
+            if self.compact:
+                f = ut.compact_timesheet(f)
+            self._timesheet_chunks.append(f)
+        self.clear_memo()
+
+    def memory_usage(self):
         """
-        self.name = check_str(name)
-        self.description = check_str(description)
-        self.client = check_str(client)
-        self.budget = check_pos(budget)                       
-        self.currency = check_str(currency)
-        self.tasks_df = check_tasks_df(tasks_df, budget)
-        self.workers_df = check_workers_df(workers_df)
-        self.timesheet_df = check_timesheet_df(timesheet_df, tasks_df,
-          workers_df)
+        Return a Pandas Series of the estimated numbers of bytes used by the parts of this project, as given by :func:`utilities.get_nbytes`, indexed by
+
+        - ``'tasks_df'``, ``'workers_df'``, ``'rates_df'``, ``'timesheet_df'``, ``'cube'``: the attributes of the same names, where timesheet pieces not yet read count as 0 bytes
+        - ``'memo'``: the values in the memo
+        - ``'total'``: the sum of the above
+        """
+        sizes = OrderedDict()
+        for attr in ['tasks_df', 'workers_df', 'rates_df']:
+            sizes[attr] = ut.get_nbytes(getattr(self, attr))
+        sizes['timesheet_df'] = sum(ut.get_nbytes(c) 
+          for c in self._timesheet_chunks if not callable(c))
+        sizes['cube'] = ut.get_nbytes(self.cube)
+        sizes['memo'] = sum(ut.get_nbytes(v) for v in self.memo.values())
+        sizes['total'] = sum(sizes.values())
+        return pd.Series(sizes)
         
     def __repr__(self):
         result = []
         for attr in cs.PROJECT_ATTRS:
             val = getattr(self, attr)
-            if attr == 'timesheet_df':
+            if attr == 'timesheet_df' and val is not None:
                 attr = 'timesheet_df (head)'
                 val = val.head()
             s = '{!s}: {!s}\n'.format(attr, val)
@@ -76,16 +237,17 @@ class Project(object):
 
     def copy(self):
         """
-        Return a copy of this project, that is, a project with all the same attributes.
+        Return a copy of this project, that is, a project with all the same attributes and an empty memo, made in constant time without checking or copying any data: the copy shares the data frames and timesheet rows of this project and the arrays of its cube (see :meth:`cube.Cube.copy`).
+        Setting or appending to an attribute of either project afterwards leaves the other unchanged, but changing a data frame in place changes both.
         """
-        other = Project()
-        for key in cs.PROJECT_ATTRS:
-            value = getattr(self, key)
-            if isinstance(value, pd.DataFrame):
-                # Pandas copy data frame
-                value = value.copy()
-            setattr(other, key, value)
-        
+        other = Project(self.name, self.description, self.client, 
+          self.budget, self.currency, self.tasks_df, self.workers_df, 
+          rates_df=self.rates_df, validate=False, compact=self.compact)
+        other.set_input('timesheet_chunks', list(self._timesheet_chunks))
+        other.max_memo_size = self.max_memo_size
+        other.store = self.store
+        if self.cube is not None:
+            other.cube = self.cube.copy()
         return other
 
 
@@ -121,6 +283,13 @@ def read_config(config_path):
             Fei,170
             Winnie,160
 
+    It may also have the key ``rates_df``, a CSV string of rate changes, e.g.::
+
+        rates_df: |
+            worker,effective_date,rate
+            Captain Chi,2017-01-01,220
+            Fei,2017-01-01,180
+
     """
     path = Path(config_path)
     with path.open() as src:
@@ -133,9 +302,14 @@ def read_config(config_path):
     if 'workers_df' in d:
         d['workers_df'] = ut.parse_df(d['workers_df'], dtype=cs.DTYPE)
 
+    if 'rates_df' in d:
+        d['rates_df'] = ut.parse_df(d['rates_df'], dtype=cs.DTYPE, 
+          parse_dates=['effective_date'])
+
     return d
 
-def read_timesheet(timesheet_path, replicon_options=None):
+def read_timesheet(timesheet_path, replicon_options=None, cache_dir=None,
+  max_cache_size=2**30):
     """
     Read a CSV or a Replicon XML timesheet file located at the given path.
     Convert the file to a data frame and return the result.
@@ -143,39 +317,217 @@ def read_timesheet(timesheet_path, replicon_options=None):
     A CSV timesheet should have the columns specified in the Project class docstring.
     A Replicon XML file should have the columns specified in the docstring for the function :func:`replicon.read_replicon`.
     That function is called with the dictionary of options ``replicon_options`` in case a Replicon XML is given.  
+
+    If a ``cache_dir`` is given, then cache the resulting data frame there in the format of :func:`cache.write_frame`, keyed by the path, size, and modification time of the file and by ``replicon_options``, and keep the cache under ``max_cache_size`` bytes; see :func:`cache.cached`.
+    Later reads of the unchanged file then load the cached data frame instead of parsing the file.
+
+    If ``timesheet_path`` is instead a list of paths or a glob pattern (see :func:`replicon.is_pattern`), then read the Replicon XML files it gives in parallel with :func:`replicon.read_replicons`, without caching, and return their concatenation; these files must be XML.
     """
+    import project_reporter.replicon as rp
+
+    if replicon_options is None:
+        replicon_options = {}
+
+    if isinstance(timesheet_path, (list, tuple)) or \
+      rp.is_pattern(timesheet_path):
+        with it.stage('read_replicons') as s:
+            f = rp.read_replicons(timesheet_path, replicon_options)
+            s.rows = f.shape[0]
+        return f
+
+    def read(path):
+        import magic
+
+        with it.stage('detect_format'):
+            mime_type = magic.from_file(str(path), mime=True)
+        if 'xml' in mime_type:
+            # Replicon time sheet
+            with it.stage('read_replicon') as s:
+                f = rp.read_replicon(path, **replicon_options) 
+                s.rows = f.shape[0]
+            with it.stage('reformat_replicon') as s:
+                f = rp.reformat_replicon(f)
+                for col in ['task', 'worker']:
+                    f[col] = f[col].astype('category')
+                s.rows = f.shape[0]
+        elif 'text' in mime_type:
+            with it.stage('read_csv') as s:
+                f = pd.read_csv(path, dtype=cs.DTYPE, parse_dates=['date'])
+                s.rows = f.shape[0]
+        else:
+            raise TypeError('{!s} not a recognized file format'.format(path))
+        return f
+
     path = Path(timesheet_path)
-    mime_type = magic.from_file(str(path), mime=True)
+    if cache_dir is None:
+        return read(path)
+
+    return ch.cached(read, path, cache_dir, options=replicon_options, 
+      max_size=max_cache_size)
+
+def iter_timesheet(timesheet_path, replicon_options=None, 
+  chunksize=10**5):
+    """
+    Read a CSV or a Replicon XML timesheet file located at the given path, as :func:`read_timesheet` does, but in chunks.
+    Yield data frames of at most ``chunksize`` rows each, so that memory use is bounded by the chunk size and not by the file size.
+    """
+    import magic
+    import project_reporter.replicon as rp
+
+    if replicon_options is None:
+        replicon_options = {}
 
+    path = Path(timesheet_path)
+    mime_type = magic.from_file(str(path), mime=True)
     if 'xml' in mime_type:
-        # Replicon time sheet
-        if replicon_options is None:
-            replicon_options = {}
-        f = rp.read_replicon(path, **replicon_options) 
-        f = rp.reformat_replicon(f)
+        for f in rp.iter_replicon(path, batch_size=chunksize, 
+          **replicon_options):
+            yield rp.reformat_replicon(f)
     elif 'text' in mime_type:
-        f = pd.read_csv(path, dtype=cs.DTYPE, parse_dates=['date'])
+        for f in pd.read_csv(path, dtype=cs.DTYPE, parse_dates=['date'],
+          chunksize=chunksize):
+            yield f
     else:
         raise TypeError('{!s} not a recognized file format'.format(path))
 
-    return f 
-
-def read_project(config_path, timesheet_path=None, replicon_options=None):
+def stream_timesheet(project, timesheet_path, replicon_options=None,
+  chunksize=10**5):
+    """
+    Read the timesheet file located at the given path in chunks with :func:`iter_timesheet`, check each chunk against the tasks and workers of the given project, and add its costs to the project's cube, creating the cube if necessary.
+    Do not keep the rows, so that memory use is bounded by the chunk size plus the cube size.
+    Return the project, whose summaries then come from the cube; see :func:`main.summarize`.
+    """
+    if project.cube is None:
+        project.cube = cb.Cube(project.tasks_df, project.workers_df)
+    for f in iter_timesheet(timesheet_path, replicon_options, chunksize):
+        with it.stage('stream_chunk') as s:
+            project.append_timesheet(f, keep_rows=False)
+            s.rows = f.shape[0]
+    return project
+
+def read_project(config_path, timesheet_path=None, replicon_options=None,
+  cache_dir=None, chunksize=None, compact=False):
     """
     Read a project dictionary from a YAML file located at the path ``config_path``, and read a project timesheet from the path ``timesheet_path``.
     Parse these files, check them, and, if successful, return a corresponding Project instance.
+    The options ``replicon_options`` and ``cache_dir`` are passed to :func:`read_timesheet`.
+
+    If ``compact``, then return a compact project; see the Project class docstring.
+
+    If ``chunksize`` is given, then instead stream the timesheet into the project's cube in chunks of that many rows with :func:`stream_timesheet`, and leave the project timesheet as ``None``.
     """
-    project_dict = read_config(config_path)
+    with it.stage('read_config'):
+        project_dict = read_config(config_path)
+    if timesheet_path is not None and chunksize is not None:
+        with it.stage('validate'):
+            project = Project(compact=compact, **project_dict)
+        return stream_timesheet(project, timesheet_path, 
+          replicon_options=replicon_options, chunksize=chunksize)
     if timesheet_path is not None:
-        project_dict['timesheet_df'] = read_timesheet(timesheet_path,
-          replicon_options=replicon_options)
+        with it.stage('read_timesheet') as s:
+            f = read_timesheet(timesheet_path, 
+              replicon_options=replicon_options, cache_dir=cache_dir)
+            s.rows = f.shape[0]
+        project_dict['timesheet_df'] = f
+
+    with it.stage('validate') as s:
+        project = Project(compact=compact, **project_dict)
+        if timesheet_path is not None:
+            s.rows = f.shape[0]
+    return project
+
+def write_project(project, path):
+    """
+    Write a snapshot of the given project to a directory at the given path, overwriting any existing directory there, and return the path.
+    The directory contains
 
-    return Project(**project_dict)
+    - ``meta.json``: the storage format version, the scalar attributes of the project, and the number of timesheet rows or ``None`` if the project has no timesheet
+    - ``tasks``, ``workers``, and ``rates`` (if the project has rate changes): ``tasks_df``, ``workers_df``, and ``rates_df`` in the format of :func:`cache.write_frame`
+    - ``timesheet`` (if the project has a timesheet): ``timesheet_df`` in the format of :func:`cache.write_frame`, with the dates as ``int32`` days since 1970-01-01 (times of day are dropped), the tasks and workers as integer codes plus dictionaries of their distinct values, and the durations as floats
 
-def write_project(project, config_path, timesheet_path=None):
+    Read it back with :func:`read_snapshot`.
+    Raise a ``ValueError`` if the project has a cube or a store but no timesheet rows, e.g. because it was streamed (see :func:`read_project`) or read from a store, since the snapshot would lack its timesheet.
     """
+    f = project.timesheet_df
+    if f is None and (project.cube is not None or project.store is not None):
+        raise ValueError('The project needs a timesheet for this operation')
+
+    path = Path(path)
+    tmp_path = path.parent/'.{!s}.{!s}'.format(path.name, uuid.uuid4().hex)
+    tmp_path.mkdir(parents=True)
+
+    ch.write_frame(project.tasks_df, tmp_path/'tasks')
+    ch.write_frame(project.workers_df, tmp_path/'workers')
+    if project.rates_df is not None:
+        ch.write_frame(project.rates_df, tmp_path/'rates')
+    if f is not None:
+        g = pd.DataFrame(OrderedDict([
+          ('date', f['date'].values.astype('M8[D]').astype(np.int32)),
+          ('task', f['task'].astype('category').values),
+          ('worker', f['worker'].astype('category').values),
+          ('duration', f['duration'].values.astype(float)),
+          ]))
+        ch.write_frame(g, tmp_path/'timesheet')
+
+    meta = {attr: getattr(project, attr) 
+      for attr in ['name', 'description', 'client', 'currency']}
+    meta['budget'] = float(project.budget)
+    meta['version'] = ch.FORMAT_VERSION
+    meta['num_rows'] = None if f is None else int(f.shape[0])
+    with (tmp_path/'meta.json').open('w') as tgt:
+        json.dump(meta, tgt)
+
+    if path.exists():
+        shutil.rmtree(str(path))
+    os.replace(str(tmp_path), str(path))
+    return path
+
+def read_snapshot(path, mmap_mode='r', compact=True):
     """
-    pass
+    Read a project snapshot written by :func:`write_project` to the directory at the given path, and return the project.
+    The snapshot holds a checked project, so it is not checked again.
+
+    The timesheet is only read when ``timesheet_df`` is first accessed, with its arrays loaded via :func:`cache.read_frame` using the given ``mmap_mode``, so that opening a snapshot takes constant time and memory.
+    If ``compact``, then the project is compact (see the Project class docstring) and its timesheet, whose dates are ``int32`` days as in :func:`utilities.compact_timesheet`, wraps the memory-mapped date, code, and duration arrays, so it costs almost no resident memory until pages are touched, and the costs of its rows are computed on demand.
+    Otherwise, the dates are expanded to ``datetime64[ns]``, which takes time and memory proportional to the number of rows.
+    """
+    path = Path(path)
+    with (path/'meta.json').open() as src:
+        meta = json.load(src)
+    if meta['version'] != ch.FORMAT_VERSION:
+        raise ValueError('Snapshot format version {!s} is not the '\
+          'current version {!s}'.format(meta['version'], ch.FORMAT_VERSION))
+
+    project = Project(meta['name'], meta['description'], meta['client'],
+      meta['budget'], meta['currency'], ch.read_frame(path/'tasks'),
+      ch.read_frame(path/'workers'), 
+      rates_df=ch.read_frame(path/'rates') if (path/'rates').exists() 
+      else None, validate=False, compact=compact)
+
+    def read_timesheet():
+        with it.stage('read_snapshot_timesheet') as s:
+            f = ch.read_frame(path/'timesheet', mmap_mode=mmap_mode)
+            if not compact:
+                f['date'] = f['date'].values.astype('M8[D]')\
+                  .astype('M8[ns]')
+            s.rows = f.shape[0]
+        return f
+
+    if meta['num_rows'] is not None:
+        project.set_input('timesheet_chunks', [read_timesheet])
+    return project
+
+def read_store_project(store, name):
+    """
+    Read the project with the given name from the given project store (:class:`store.Store` instance or path of one), and return it with its store set and no timesheet data frame.
+    Its costs and summaries are then computed in the store; see :func:`main.compute_costs` and :func:`main.summarize`.
+    The project was checked when added to the store, so it is not checked again.
+    """
+    if not isinstance(store, st.Store):
+        store = st.Store(store)
+    project = Project(validate=False, **store.read_attrs(name))
+    project.store = store
+    return project
 
 # ---------------
 # Format checkers
@@ -198,9 +550,8 @@ def check_df_header(f, expect_cols):
     return f
 
 def df_no_nans(f):
-    for col in f.columns:
-        if f[col].isnull().sum() != 0:
-            raise vt.Invalid("NaNs found")
+    if f.isnull().values.any():
+        raise vt.Invalid("NaNs found")
     return f
 
 check_df_no_nans = vt.Schema(df_no_nans)
@@ -211,14 +562,31 @@ def check_df(f, expect_cols):
     f = check_df_no_nans(f)    
     return f 
 
+def is_float(v):
+    return isinstance(v, float)
+
+def check_float_column(f, col):
+    """
+    Raise a ``voluptuous.Invalid`` error if the given column of the given data frame has a value that is not a float.
+    The values are scanned only if the column does not have a floating point dtype, to find the first such value; a column of another dtype holding only floats passes.
+    """
+    if not pd.api.types.is_float_dtype(f[col]):
+        for v in f[col].values:
+            if not is_float(v):
+                raise vt.Invalid('Found the non-numerical value {!s}'.format(
+                  v))
+    return f
+
+def check_unique_column(f, col):
+    if f[col].duplicated().any():
+        raise vt.Invalid('Found duplicate values in column {!s}'.format(
+          col))
+    return f
+
 def check_tasks_df(f, budget):
     f = check_df(f, ['task', 'budget'])
-
-    # Check data types 
-    for v in f['budget'].values:
-        if not isinstance(v, float):
-            raise vt.Invalid('Found the non-numerical value {!s}'.\
-              format(v))
+    f = check_unique_column(f, 'task')
+    f = check_float_column(f, 'budget')
 
     # Check budget not exceeded
     b = f['budget'].sum()
@@ -231,38 +599,100 @@ def check_tasks_df(f, budget):
 
 def check_workers_df(f):
     f = check_df(f, ['worker', 'rate'])
-
-    # Check data types 
-    for v in f['rate'].values:
-        if not isinstance(v, float):
-            raise vt.Invalid('Found the non-numerical value {!s}'.\
-              format(v))
-
+    f = check_unique_column(f, 'worker')
+    f = check_float_column(f, 'rate')
     return f
 
-def check_timesheet_df(timesheet_df, tasks_df, workers_df):
-    f = timesheet_df.copy()
+def check_rates_df(f, workers_df):
     if f is None:
-        return f 
+        return f
+    f = check_df(f, ['worker', 'effective_date', 'rate'])
+    f = check_float_column(f, 'rate')
+    if not pd.api.types.is_datetime64_any_dtype(f['effective_date']):
+        raise vt.Invalid('Found effective dates that are not dates')
+    is_bad = ut.get_positions(f['worker'], workers_df['worker']) < 0
+    if is_bad.any():
+        raise vt.Invalid('Found workers not in the project config: '\
+          '{!s}'.format(set(f['worker'][is_bad])))
+    if f.duplicated(['worker', 'effective_date']).any():
+        raise vt.Invalid('Found duplicate effective dates for a worker')
+    return f
 
-    f = check_df(f, ['date', 'task', 'worker', 'duration'])
+def find_timesheet_problems(timesheet_df, tasks_df, workers_df):
+    """
+    Return a data frame listing every problem found in the rows of the given timesheet, with the columns
 
-    # Check data types 
-    for v in f['duration'].values:
-        if not isinstance(v, float):
-            raise vt.Invalid('{!s} has the non-numerical value {!s}'.\
-              format(name, v))
+    - ``'row'``: index label of the offending row
+    - ``'column'``: column containing the offending value
+    - ``'value'``: the offending value
+    - ``'problem'``: one of ``'missing value'``, ``'non-numerical value'``, ``'task not in project config'``, ``'worker not in project config'``
 
-    # Check tasks
-    D = set(f['task']) - set(tasks_df['task'])
-    if D:
-        raise vt.Invalid(
-          'Found tasks not in the project config: {!s}'.format(D))
+    The data frame is empty if no problems are found.
+    The timesheet is assumed to have the header specified in the Project class docstring.
+    Nulls are found in one pass over the whole frame, and tasks and workers are checked once per distinct value via categorical codes.
+    """
+    f = timesheet_df
+    cols = ['row', 'column', 'value', 'problem']
+    frames = []
+
+    def add(mask, col, problem):
+        if mask.any():
+            frames.append(pd.DataFrame(OrderedDict([
+              ('row', f.index[mask]),
+              ('column', col),
+              ('value', np.asarray(f[col].values, dtype=object)[mask]),
+              ('problem', problem),
+              ])))
+
+    nulls = f.isnull().values
+    for k, col in enumerate(f.columns):
+        add(nulls[:, k], col, 'missing value')
+
+    if not pd.api.types.is_float_dtype(f['duration']):
+        is_bad = ~f['duration'].map(is_float).values.astype(bool)
+        add(is_bad & ~f['duration'].isnull().values, 'duration', 
+          'non-numerical value')
+
+    for col, df in [('task', tasks_df), ('worker', workers_df)]:
+        is_bad = ut.get_positions(f[col], df[col]) < 0
+        add(is_bad & ~f[col].isnull().values, col, 
+          '{!s} not in project config'.format(col))
+
+    if not frames:
+        return pd.DataFrame(columns=cols)
+    return pd.concat(frames, ignore_index=True)[cols]
+
+def check_timesheet_df(timesheet_df, tasks_df, workers_df, copy=False,
+  report=False):
+    """
+    Check the given timesheet against the given tasks and workers data frames, and return the timesheet, copied if ``copy``, if it is valid.
+    Otherwise raise a ``voluptuous.Invalid`` error describing the first kind of problem found.
+
+    If ``report``, then instead of raising an error on row-level problems, return the data frame of all problems output by :func:`find_timesheet_problems`.
+    """
+    f = timesheet_df
+    if f is None:
+        return f 
 
-    # Check workers
-    D = set(f['worker']) - set(workers_df['worker'])
-    if D:
-        raise vt.Invalid(
-          'Found workers not in the project config: {!s}'.format(D))
+    f = check_df_instance(f)
+    f = check_df_header(f, ['date', 'task', 'worker', 'duration'])
+    problems = find_timesheet_problems(f, tasks_df, workers_df)
+    if report:
+        return problems
 
-    return f 
\ No newline at end of file
+    for problem, group in problems.groupby('problem', sort=False):
+        if problem == 'missing value':
+            raise vt.Invalid("NaNs found")
+        elif problem == 'non-numerical value':
+            raise vt.Invalid('Found the non-numerical value {!s}'.format(
+              group['value'].iat[0]))
+        elif problem == 'task not in project config':
+            raise vt.Invalid('Found tasks not in the project config: '\
+              '{!s}'.format(set(group['value'])))
+        elif problem == 'worker not in project config':
+            raise vt.Invalid('Found workers not in the project config: '\
+              '{!s}'.format(set(group['value'])))
+
+    if copy:
+        f = f.copy()
+    return f
@@ -1,7 +1,9 @@
 from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
+import glob
 
 import pandas as pd
-from xml.sax import ContentHandler, parse
+from xml.sax import ContentHandler, make_parser, parse
 
 import project_reporter.utilities as ut 
 
@@ -35,8 +37,133 @@ class ExcelHandler(ContentHandler):
         elif name=="Table":
             self.tables.append(self.rows)
 
+class RowHandler(ContentHandler):
+    """
+    SAX handler that keeps only the rows of the first ``Table`` of an Excel XML file that are needed for the header and the data, as determined by the arguments of :func:`iter_replicon`.
+    Completed data rows are appended to ``self.rows`` for the caller to drain, and ``self.done`` is set once the last needed row has been parsed.
+    """
+    def __init__(self, header_row, start_row, end_row, start_column, 
+      end_column):
+        self.header_row = header_row
+        self.start_row = start_row
+        self.end_row = end_row
+        self.start_column = start_column
+        self.end_column = end_column
+        self.header = None
+        self.rows = [  ]
+        self.done = False
+        self.num_tables = 0
+        self.row_num = -1
+        self.keep = False
+        self.in_data = False
+        self.in_cell = False
+        self.chars = [  ]
+        self.cells = [  ]
+
+    def characters(self, content):
+        if self.in_cell:
+            self.chars.append(content)
+
+    def startElement(self, name, atts):
+        if self.done:
+            return
+        if name=="Cell":
+            self.in_cell = self.keep
+            self.chars = [  ]
+        elif name=="Row" and self.num_tables == 1:
+            self.row_num += 1
+            i = self.row_num
+            self.in_data = i >= self.start_row and (self.end_row is None
+              or i < self.end_row)
+            self.keep = self.in_data or i == self.header_row
+            self.cells = [  ]
+        elif name=="Table":
+            self.num_tables += 1
+
+    def endElement(self, name):
+        if self.done:
+            return
+        if name=="Cell":
+            if self.in_cell:
+                self.cells.append(''.join(self.chars))
+            self.in_cell = False
+        elif name=="Row" and self.keep:
+            cells = [x.strip() 
+              for x in self.cells[self.start_column:self.end_column]]
+            if self.row_num == self.header_row:
+                self.header = cells
+            if self.in_data:
+                self.rows.append(cells)
+            self.keep = False
+            if self.end_row is not None and self.row_num >= self.end_row - 1\
+              and self.header is not None:
+                self.done = True
+        elif name=="Table":
+            self.done = True
+
+def iter_replicon(path, header_row=11, start_row=13, end_row=None, 
+  start_column=1, end_column=None, batch_size=10000, 
+  buffer_size=2**16):
+    """
+    Stream a Replicon timesheet (Excel XML file) located at the given path (string or Path object), interpreting the row and column arguments as in :func:`read_replicon`.
+    Yield data frames of at most ``batch_size`` rows each, with the header as columns, or a single empty data frame if there are no data rows.
+
+    Only the first table of the file is read, rows before ``start_row`` (other than the header) are skipped without being stored, and parsing stops as soon as row ``end_row`` is reached.
+    The file is fed to the parser ``buffer_size`` bytes at a time, so peak memory depends on ``batch_size`` and not on the file size.
+
+    Negative row numbers count from the end of the table, as in list slicing.
+    A negative ``end_row`` is streamed too, by holding back the last ``-end_row`` data rows parsed until the table ends, but a negative ``header_row`` or ``start_row`` needs the whole table, so then the file is parsed in full first.
+    """
+    if header_row < 0 or start_row < 0:
+        excel = ExcelHandler()
+        parse(str(path), excel)
+        table = excel.tables[0]
+        columns = [x.strip() 
+          for x in table[header_row][start_column:end_column]]
+        data = [[y.strip() for y in x[start_column:end_column]] 
+          for x in table[start_row:end_row]]
+        for i in range(0, max(len(data), 1), batch_size):
+            yield pd.DataFrame(data[i:i + batch_size], columns=columns)
+        return
+
+    hold = 0
+    if end_row is not None and end_row < 0:
+        hold, end_row = -end_row, None
+    handler = RowHandler(header_row, start_row, end_row, start_column, 
+      end_column)
+    parser = make_parser()
+    parser.setContentHandler(handler)
+
+    num_batches = 0
+
+    def get_batches(final=False):
+        nonlocal num_batches
+        rows, held = handler.rows, hold
+        if final:
+            # Drop the rows held back
+            rows, held = rows[:max(len(rows) - hold, 0)], 0
+        while handler.header is not None and (len(rows) - held >= batch_size
+          or (final and (rows or not num_batches))):
+            batch, rows = rows[:batch_size], rows[batch_size:]
+            handler.rows = rows
+            num_batches += 1
+            yield pd.DataFrame(batch, columns=handler.header)
+
+    with Path(path).open('rb') as src:
+        while not handler.done:
+            chunk = src.read(buffer_size)
+            if not chunk:
+                break
+            parser.feed(chunk)
+            yield from get_batches()
+
+    if handler.header is None:
+        raise ValueError('Header row {!s} not found in {!s}'.format(
+          header_row, path))
+    yield from get_batches(final=True)
+
 def read_replicon(path, header_row=11, start_row=13, end_row=None, 
-  start_column=1, end_column=None):
+  start_column=1, end_column=None, batch_size=10000):
     """
     Read a Replicon timesheet (Excel XML file) located at the given path (string or Path object).
     Assume that:
@@ -47,19 +174,38 @@ def read_replicon(path, header_row=11, start_row=13, end_row=None,
     Here row and column numbers start at zero and setting the end row or end column to ``None`` means reading to the last row or last column, respectively, of the file.
     
     Return a Pandas data frame representing the timesheet data and header.
+
+    The file is streamed with :func:`iter_replicon` in batches of ``batch_size`` rows, so only the requested rows are ever held in memory.
     """
-    path = Path(path)
-    excel = ExcelHandler()
-    parse(str(path), excel)
-    table = excel.tables[0]
-    columns = [x.strip() for x in table[header_row][start_column:end_column]]
-    data = [[y.strip() for y in x[start_column:end_column]] 
-      for x in table[start_row:end_row]]
-    f = pd.DataFrame(data, columns=columns)
-    
-    return f
+    frames = list(iter_replicon(path, header_row=header_row, 
+      start_row=start_row, end_row=end_row, start_column=start_column,
+      end_column=end_column, batch_size=batch_size))
+    if len(frames) == 1:
+        return frames[0]
+
+    return pd.concat(frames, ignore_index=True)
 
-def reformat_replicon(replicon_df):
+def clean_worker(x):
+    """
+    Return the given Replicon user name with the order of its comma-separated parts reversed, e.g. 'Ma, Dragon' becomes 'Dragon Ma'.
+    """
+    names = x.split(', ')
+    if len(names) >= 2:
+        names = names[::-1]
+    return ' '.join(names).strip()
+
+def map_unique(values, func):
+    """
+    Factorize the given values, apply the given function to the array of distinct non-null values, and return the NumPy array of its results broadcast back through the codes of the values, with nulls mapping to nulls.
+    So the function sees each distinct value only once.
+    """
+    codes, uniques = pd.factorize(values)
+    results = pd.Series(func(uniques))
+    if (codes < 0).any():
+        return results.reindex(codes).values
+    return results.values[codes]
+
+def reformat_replicon(replicon_df, date_format=None):
     """
     Given a Replicon data frame (in the form output by :func:`read_replicon`) that contains at least the columns
     
@@ -76,41 +222,77 @@ def reformat_replicon(replicon_df):
     - ``'duration'``.
     
     Return the resulting data frame.
+
+    Dates are parsed with the given ``strftime`` format, if any, and worker names are cleaned, once per distinct value; the input data frame is not copied.
     """
-    f = replicon_df.copy()
-    
-    # Drop extraneous columns
-    drop_cols = [
-        'Client Name', 
-        'Non-Billable Hrs', 
-        'Total Hrs',
-        'Employee Id',
-        ]
-    f = f.drop(drop_cols, axis=1, errors='ignore')
-    
-    # Rename columns
-    f = f.rename(columns={c: c.lower().strip().replace(' ', '_') 
-      for c in f.columns})
-    f = f.rename(columns={
-        'task_name': 'task',
-        'user_name': 'worker',
-        'billable_hrs': 'duration',
-        'entry_date': 'date'
-        })
-    
-    # Fix dtypes
-    f['date'] = pd.to_datetime(f['date'])
-    f['duration'] = f['duration'].astype(float)
-    
-    # Clean worker
-    def clean_worker(x):
-        names = x.split(', ')
-        if len(names) >= 2:
-            names = names[::-1]
-        return ' '.join(names).strip()
-    
-    f['worker'] = f['worker'].map(clean_worker)
-    
-    # Restrict columns
-    new_cols = ['date', 'task', 'worker', 'duration']
-    return f[new_cols].copy()
+    # Find columns by their normalized names
+    cols = {c.lower().strip().replace(' ', '_'): c 
+      for c in replicon_df.columns}
+    get = lambda name: replicon_df[cols[name]].values
+
+    f = pd.DataFrame(index=replicon_df.index)
+    f['date'] = map_unique(get('entry_date'), 
+      lambda x: pd.to_datetime(x, format=date_format))
+    f['task'] = get('task_name')
+    f['worker'] = map_unique(get('user_name'), 
+      lambda x: [clean_worker(y) for y in x])
+    f['duration'] = get('billable_hrs').astype(float)
+    return f
+
+def read_replicon_file(path, replicon_options=None):
+    """
+    Read the Replicon timesheet located at the given path with :func:`read_replicon`, called with the dictionary of options ``replicon_options``, and reformat it with :func:`reformat_replicon`.
+    Return the resulting timesheet data frame with the ``'task'`` and ``'worker'`` columns categorical, which makes it cheap to send between processes.
+    Raise a ``TypeError`` if the file is not XML.
+    """
+    import magic
+
+    if replicon_options is None:
+        replicon_options = {}
+    if 'xml' not in magic.from_file(str(path), mime=True):
+        raise TypeError('{!s} is not a Replicon XML file'.format(path))
+    f = reformat_replicon(read_replicon(path, **replicon_options))
+    for col in ['task', 'worker']:
+        f[col] = f[col].astype('category')
+    return f
+
+def is_pattern(path):
+    """
+    Return ``True`` if the given path (string or Path object) is a glob pattern, that is, if it has glob characters and is not the path of an existing file, such as ``'timesheet [final].xml'``.
+    """
+    return glob.has_magic(str(path)) and not Path(path).exists()
+
+def get_paths(paths):
+    """
+    Return the list of paths given by the given glob pattern (string or Path object; see :func:`is_pattern`), sorted, or by the given list of paths and glob patterns, in order.
+    Raise a ``ValueError`` if there are no paths.
+    """
+    if isinstance(paths, (str, Path)):
+        paths = [paths]
+    result = []
+    for path in paths:
+        if is_pattern(path):
+            result.extend(Path(p) for p in sorted(glob.glob(str(path))))
+        else:
+            result.append(Path(path))
+    if not result:
+        raise ValueError('No files found for {!s}'.format(paths))
+    return result
+
+def read_replicons(paths, replicon_options=None, processes=None):
+    """
+    Read and reformat the Replicon timesheets located at the given paths, given as in :func:`get_paths`, with :func:`read_replicon_file` and the same ``replicon_options`` for every file.
+    The files are parsed in parallel in ``processes`` worker processes (defaults to the number of CPUs), or in this process if there is only one file or ``processes`` is 1.
+
+    Return the concatenation of the resulting timesheets, in the order of the paths, with a fresh integer index and with ``'task'`` and ``'worker'`` columns that are categorical with one set of categories shared by all the rows; see :func:`utilities.concat_categoricals`.
+    """
+    paths = get_paths(paths)
+    if len(paths) == 1 or processes == 1:
+        frames = [read_replicon_file(path, replicon_options) 
+          for path in paths]
+    else:
+        with ProcessPoolExecutor(max_workers=processes) as executor:
+            frames = list(executor.map(read_replicon_file, paths, 
+              [replicon_options]*len(paths)))
+
+    return ut.concat_categoricals(frames, ['task', 'worker'])
@@ -0,0 +1,80 @@
+"""
+This module implements what-if scenarios of projects.
+A *scenario* of a project is a variant of it with some task budgets or worker rates changed, made with :func:`make_scenario`.
+Scenarios share the timesheet rows and the cube durations of their project and only copy the data frames that change, so that hundreds of them can be summarized for about the cost of one.
+"""
+import pandas as pd
+
+import project_reporter.project as pj
+import project_reporter.main as mn
+
+
+def make_scenario(project, task_budgets=None, rates=None, budget=None):
+    """
+    Return a copy (see :meth:`project.Project.copy`) of the given project with
+
+    - the task budgets given by the dictionary ``task_budgets`` of task to budget, if given
+    - the worker rates given by the dictionary ``rates`` of worker to rate, if given, which then apply on every date, that is, the rate changes of those workers are dropped
+    - the project budget ``budget``, which defaults to the sum of the task budgets if ``task_budgets`` is given and to the project budget otherwise
+
+    Only the data frames that change are copied and checked.
+
+    The scenario gets a cube repriced from the project cube with :meth:`cube.Cube.reprice`, which shares the project cube's durations and recomputes costs only if rates change, so summaries of the scenario never rescan the timesheet rows.
+    If the project has no cube, then one is built first with :func:`main.build_cube`.
+    """
+    if project.cube is None:
+        mn.build_cube(project)
+    scenario = project.copy()
+
+    tasks_df = None
+    if task_budgets is not None:
+        unknown = set(task_budgets) - set(project.tasks_df['task'])
+        if unknown:
+            raise ValueError('Found tasks not in the project config: '\
+              '{!s}'.format(unknown))
+        tasks_df = project.tasks_df.copy()
+        tasks_df['budget'] = [float(task_budgets.get(t, b))
+          for t, b in tasks_df[['task', 'budget']].values]
+        if budget is None:
+            budget = tasks_df['budget'].sum()
+    if budget is not None:
+        budget = pj.check_pos(budget)
+        pj.check_tasks_df(project.tasks_df if tasks_df is None
+          else tasks_df, budget)
+        scenario.budget = budget
+    if tasks_df is not None:
+        scenario.tasks_df = tasks_df
+
+    workers_df = None
+    if rates is not None:
+        unknown = set(rates) - set(project.workers_df['worker'])
+        if unknown:
+            raise ValueError('Found workers not in the project config: '\
+              '{!s}'.format(unknown))
+        workers_df = project.workers_df.copy()
+        workers_df['rate'] = [float(rates.get(w, r))
+          for w, r in workers_df[['worker', 'rate']].values]
+        scenario.workers_df = pj.check_workers_df(workers_df)
+        r = project.rates_df
+        if r is not None and r['worker'].isin(list(rates)).any():
+            scenario.rates_df = r[~r['worker'].isin(list(rates))]\
+              .reset_index(drop=True)
+
+    scenario.cube = project.cube.reprice(tasks_df=tasks_df,
+      workers_df=workers_df, rates_df=scenario.rates_df)
+    return scenario
+
+def compare_scenarios(project, scenarios, **kwargs):
+    """
+    Make the scenarios of the given project given by the dictionary ``scenarios`` of scenario name to dictionary of keyword arguments for :func:`make_scenario`, and summarize the project and each scenario with :func:`main.summarize` called with the given keyword arguments.
+    Return the concatenation of the summaries with a first column ``'scenario'`` holding the scenario name, or ``None`` for the project itself.
+    """
+    frames = []
+    names = [None] + list(scenarios)
+    for name in names:
+        p = project if name is None else make_scenario(project,
+          **scenarios[name])
+        g = mn.summarize(p, **kwargs)
+        g.insert(0, 'scenario', name)
+        frames.append(g)
+    return pd.concat(frames, ignore_index=True)
@@ -0,0 +1,322 @@
+"""
+This module implements a local HTTP report server.
+The server reads each of its projects once with :func:`project.read_project`, keeps it in memory, serves its summaries and charts, and rereads a project only when its config or timesheet file changes.
+Files are read in worker processes, so that a slow read of one project never blocks requests for the others, which keep being served from memory meanwhile.
+
+The routes are
+
+- ``/``: JSON list of the projects, each with its ID, name, paths, and load error if any
+- ``/<project ID>/summary``: output of :func:`main.summarize` as JSON (records), or as CSV if the query has ``format=csv``; the query parameters ``by_task``, ``by_worker``, ``freq``, ``start``, and ``end`` are passed on
+- ``/<project ID>/chart``: HTML chart from :func:`main.plot`; the query parameters ``freq``, ``start``, ``end``, and ``forecast`` are passed on
+
+where the ID of a project is the name of its config file without suffix.
+
+Can also be run from the command line; see :func:`serve_cli`.
+"""
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
+from urllib.parse import urlsplit, parse_qs
+import argparse
+import asyncio
+import json
+import os
+import traceback
+
+import project_reporter.project as pj
+import project_reporter.main as mn
+
+
+#: Reason phrases of the HTTP statuses the server sends
+REASONS = {
+  200: 'OK',
+  400: 'Bad Request',
+  404: 'Not Found',
+  405: 'Method Not Allowed',
+  500: 'Internal Server Error',
+  503: 'Service Unavailable',
+  }
+
+def get_mtimes(*paths):
+    """
+    Return the tuple of the modification times in nanoseconds of the files at the given paths, with ``None`` for a path that is ``None`` or that does not exist.
+    """
+    mtimes = []
+    for path in paths:
+        try:
+            mtimes.append(os.stat(str(path)).st_mtime_ns)
+        except (TypeError, OSError):
+            mtimes.append(None)
+    return tuple(mtimes)
+
+def parse_bool(value):
+    """
+    Return the truth value of the given query string value.
+    """
+    if value.lower() in ['1', 'true', 'yes']:
+        return True
+    if value.lower() in ['', '0', 'false', 'no']:
+        return False
+    raise ValueError('{!s} is not a boolean'.format(value))
+
+class ReportServer(object):
+    """
+    Report server of the projects given by a list of (config path, timesheet path) pairs, or by a glob pattern of config paths as in :func:`portfolio.find_pairs`.
+    The options ``replicon_options`` and ``cache_dir`` are passed to :func:`project.read_project`, ``processes`` is the number of worker processes reading files (defaults to the number of CPUs), and the files are checked for changes every ``poll_interval`` seconds.
+
+    Each instance has the attribute ``entries``, a dictionary of project ID to dictionary with the keys
+
+    - ``'config_path'``, ``'timesheet_path'``
+    - ``'project'``: the last project read successfully or ``None``
+    - ``'mtimes'``: modification times of the files when last read
+    - ``'error'``: traceback of the last read if it failed, and ``None`` otherwise
+    - ``'task'``: the asyncio task reading the project, if it is being read
+    """
+
+    def __init__(self, pairs, replicon_options=None, cache_dir=None,
+      processes=None, poll_interval=1.0):
+        if isinstance(pairs, str):
+            import project_reporter.portfolio as pf
+
+            pairs = pf.find_pairs(pairs)
+
+        self.entries = {}
+        for config_path, timesheet_path in pairs:
+            project_id = Path(config_path).stem
+            if project_id in self.entries:
+                raise ValueError('Duplicate project ID {!s}'.format(
+                  project_id))
+            self.entries[project_id] = {
+              'config_path': config_path,
+              'timesheet_path': timesheet_path,
+              'project': None,
+              'mtimes': None,
+              'error': None,
+              'task': None,
+              }
+        self.replicon_options = replicon_options
+        self.cache_dir = cache_dir
+        self.processes = processes
+        self.poll_interval = poll_interval
+        self.executor = None
+
+    def load(self, project_id):
+        """
+        Read the project with the given ID in a worker process, unless it is already being read, and return the asyncio task doing so.
+        On success, replace the project in memory and clear the error; on failure, keep the old project and record the error.
+        """
+        entry = self.entries[project_id]
+        if entry['task'] is not None:
+            return entry['task']
+
+        async def read():
+            loop = asyncio.get_event_loop()
+            mtimes = get_mtimes(entry['config_path'],
+              entry['timesheet_path'])
+            try:
+                entry['project'] = await loop.run_in_executor(
+                  self.executor, read_served_project, entry['config_path'],
+                  entry['timesheet_path'], self.replicon_options,
+                  self.cache_dir)
+                entry['error'] = None
+            except Exception:
+                entry['error'] = traceback.format_exc()
+            finally:
+                entry['mtimes'] = mtimes
+                entry['task'] = None
+
+        entry['task'] = asyncio.ensure_future(read())
+        return entry['task']
+
+    async def watch(self):
+        """
+        Forever check the files of the projects every ``self.poll_interval`` seconds, and reread only the projects whose files changed.
+        """
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            for project_id, entry in self.entries.items():
+                if entry['task'] is None and entry['mtimes'] != get_mtimes(
+                  entry['config_path'], entry['timesheet_path']):
+                    self.load(project_id)
+
+    async def get_project(self, project_id):
+        """
+        Return the project with the given ID, waiting for its first read if necessary.
+        Raise a ``KeyError`` if there is no such project and a ``ValueError`` if it could not be read.
+        """
+        entry = self.entries[project_id]
+        if entry['project'] is None:
+            await asyncio.shield(self.load(project_id))
+        if entry['project'] is None:
+            raise ValueError(entry['error'])
+        return entry['project']
+
+    async def respond(self, method, target):
+        """
+        Return the triple (status, content type, body) of the response to a request with the given method and target.
+        """
+        if method != 'GET':
+            return 405, 'text/plain', 'Only GET is supported'
+
+        url = urlsplit(target)
+        query = {k: v[-1] for k, v in parse_qs(url.query,
+          keep_blank_values=True).items()}
+        parts = [p for p in url.path.split('/') if p]
+
+        if not parts:
+            projects = []
+            for project_id, entry in sorted(self.entries.items()):
+                project = entry['project']
+                projects.append({
+                  'id': project_id,
+                  'name': project.name if project is not None else None,
+                  'config_path': str(entry['config_path']),
+                  'timesheet_path': str(entry['timesheet_path'])
+                    if entry['timesheet_path'] else None,
+                  'error': entry['error'],
+                  })
+            return 200, 'application/json', json.dumps(projects)
+
+        if len(parts) != 2 or parts[0] not in self.entries \
+          or parts[1] not in ['summary', 'chart']:
+            return 404, 'text/plain', 'Not found: {!s}'.format(url.path)
+
+        try:
+            project = await self.get_project(parts[0])
+        except ValueError as e:
+            return 503, 'text/plain', str(e)
+
+        try:
+            kwargs = {
+              'freq': query.get('freq') or None,
+              'start': query.get('start') or None,
+              'end': query.get('end') or None,
+              }
+            if parts[1] == 'summary':
+                for key in ['by_task', 'by_worker']:
+                    kwargs[key] = parse_bool(query.get(key, ''))
+                fmt = query.get('format', 'json')
+                if fmt not in ['json', 'csv']:
+                    raise ValueError('Unknown format {!s}'.format(fmt))
+            else:
+                kwargs['forecast'] = parse_bool(query.get('forecast', ''))
+        except ValueError as e:
+            return 400, 'text/plain', str(e)
+
+        try:
+            if parts[1] == 'summary':
+                f = mn.summarize(project, **kwargs)
+                if fmt == 'csv':
+                    return 200, 'text/csv', f.to_csv(index=False)
+                return 200, 'application/json', f.to_json(
+                  orient='records', date_format='iso')
+            else:
+                chart = mn.plot(project, **kwargs)
+                return 200, 'text/html', chart.htmlcontent
+        except Exception:
+            return 500, 'text/plain', traceback.format_exc()
+
+    async def handle(self, reader, writer):
+        """
+        Handle an HTTP connection: read one request, write the response, and close the connection.
+        """
+        try:
+            request_line = (await reader.readline()).decode('latin-1')
+            while (await reader.readline()).strip():
+                # Skip headers
+                pass
+            parts = request_line.split()
+            if len(parts) == 3:
+                status, content_type, body = await self.respond(*parts[:2])
+            else:
+                status, content_type, body = 400, 'text/plain', \
+                  'Malformed request'
+
+            body = body.encode('utf-8')
+            head = 'HTTP/1.1 {!s} {!s}\r\n'\
+              'Content-Type: {!s}; charset=utf-8\r\n'\
+              'Content-Length: {!s}\r\n'\
+              'Connection: close\r\n\r\n'.format(status, REASONS[status],
+              content_type, len(body))
+            writer.write(head.encode('latin-1') + body)
+            await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def start(self, host='127.0.0.1', port=8000):
+        """
+        Start the worker processes, the first reads of all the projects, the file watcher, and the HTTP server listening on the given host and port.
+        Return the ``asyncio.Server`` instance.
+        """
+        self.executor = ProcessPoolExecutor(max_workers=self.processes)
+        for project_id in self.entries:
+            self.load(project_id)
+        self.watcher = asyncio.ensure_future(self.watch())
+        return await asyncio.start_server(self.handle, host, port)
+
+    async def stop(self, server):
+        """
+        Close the given ``asyncio.Server`` instance returned by :meth:`start`, stop the file watcher, and shut down the worker processes.
+        """
+        server.close()
+        await server.wait_closed()
+        self.watcher.cancel()
+        self.executor.shutdown(wait=False)
+
+def read_served_project(config_path, timesheet_path, replicon_options,
+  cache_dir):
+    """
+    Call :func:`project.read_project` with the given arguments and return the result, minus its memo, which is recomputed on demand in the server process.
+    Run in the worker processes of :class:`ReportServer`.
+    """
+    project = pj.read_project(config_path, timesheet_path,
+      replicon_options=replicon_options, cache_dir=cache_dir)
+    project.clear_memo()
+    return project
+
+def serve(pairs, host='127.0.0.1', port=8000, **kwargs):
+    """
+    Run a :class:`ReportServer` of the given projects, initialized with the given keyword arguments, on the given host and port until interrupted.
+    """
+    report_server = ReportServer(pairs, **kwargs)
+
+    async def run():
+        server = await report_server.start(host, port)
+        try:
+            await server.serve_forever()
+        finally:
+            await report_server.stop(server)
+
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        pass
+
+def serve_cli(argv=None):
+    """
+    Command line interface to :func:`serve`.
+    """
+    import project_reporter.portfolio as pf
+
+    parser = argparse.ArgumentParser(
+      description='Serve project summaries and charts over HTTP')
+    parser.add_argument('configs', nargs='+',
+      help='config file glob patterns or config:timesheet path pairs')
+    parser.add_argument('--host', default='127.0.0.1',
+      help='host to listen on')
+    parser.add_argument('--port', type=int, default=8000,
+      help='port to listen on')
+    parser.add_argument('--cache-dir', default=None,
+      help='directory to cache parsed timesheets in')
+    parser.add_argument('--processes', type=int, default=None,
+      help='number of worker processes reading files')
+    parser.add_argument('--poll-interval', type=float, default=1.0,
+      help='seconds between checks for changed files')
+    args = parser.parse_args(argv)
+
+    serve(pf.parse_pairs(args.configs), host=args.host, port=args.port, cache_dir=args.cache_dir,
+      processes=args.processes, poll_interval=args.poll_interval)
+
+if __name__ == '__main__':
+    serve_cli()
@@ -0,0 +1,343 @@
+"""
+This module implements a SQLite store of projects.
+A *store* is a SQLite database file holding the attributes, tasks, workers, and timesheet rows of any number of projects, keyed by project name, so that long timesheet histories live on disk instead of in memory.
+A project read from a store (see :func:`project.read_store_project`) has no timesheet data frame, and :func:`main.compute_costs` and :func:`main.summarize` send its joins and groupings to SQLite, so only their results are loaded into Pandas.
+
+CONVENTIONS:
+    - Dates are stored as integer days since 1970-01-01, so times of day are dropped
+    - Timesheet rows refer to tasks and workers by their integer IDs, and are indexed by (task ID, worker ID, date) and by (project ID, date)
+"""
+from collections import OrderedDict
+import sqlite3
+
+import pandas as pd
+import numpy as np
+
+import project_reporter.utilities as ut
+
+
+#: SQL statements creating the store tables and indexes
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS projects (
+  id INTEGER PRIMARY KEY,
+  name TEXT NOT NULL UNIQUE,
+  description TEXT NOT NULL,
+  client TEXT NOT NULL,
+  budget REAL NOT NULL,
+  currency TEXT NOT NULL
+  );
+CREATE TABLE IF NOT EXISTS tasks (
+  id INTEGER PRIMARY KEY,
+  project_id INTEGER NOT NULL REFERENCES projects (id),
+  task TEXT NOT NULL,
+  budget REAL NOT NULL,
+  UNIQUE (project_id, task)
+  );
+CREATE TABLE IF NOT EXISTS workers (
+  id INTEGER PRIMARY KEY,
+  project_id INTEGER NOT NULL REFERENCES projects (id),
+  worker TEXT NOT NULL,
+  rate REAL NOT NULL,
+  UNIQUE (project_id, worker)
+  );
+CREATE TABLE IF NOT EXISTS rates (
+  project_id INTEGER NOT NULL REFERENCES projects (id),
+  worker_id INTEGER NOT NULL REFERENCES workers (id),
+  effective_date INTEGER NOT NULL,
+  rate REAL NOT NULL,
+  UNIQUE (worker_id, effective_date)
+  );
+CREATE TABLE IF NOT EXISTS timesheet (
+  project_id INTEGER NOT NULL REFERENCES projects (id),
+  date INTEGER NOT NULL,
+  task_id INTEGER NOT NULL REFERENCES tasks (id),
+  worker_id INTEGER NOT NULL REFERENCES workers (id),
+  duration REAL NOT NULL
+  );
+CREATE INDEX IF NOT EXISTS timesheet_task_worker_date
+  ON timesheet (task_id, worker_id, date);
+CREATE INDEX IF NOT EXISTS timesheet_project_date
+  ON timesheet (project_id, date);
+"""
+
+#: SQL expression of the rate of the worker of a timesheet row ``s`` on its date, from the worker's rate changes or, if none is effective yet, from the worker row ``w``; see :func:`main.get_rates`
+RATE = """COALESCE((SELECT r.rate FROM rates r 
+  WHERE r.worker_id = s.worker_id AND r.effective_date <= s.date 
+  ORDER BY r.effective_date DESC LIMIT 1), w.rate)"""
+
+#: Nanoseconds per day
+DAY = 86400*10**9
+
+def to_days(date, round_up=False):
+    """
+    Return the given date (anything ``pd.Timestamp`` accepts) as integer days since 1970-01-01, rounded down, or up if ``round_up``.
+    """
+    ns = pd.Timestamp(date).value
+    return -(-ns//DAY) if round_up else ns//DAY
+
+class Store(object):
+    """
+    This class encodes a project store.
+    Each instance has the following properties.
+
+    - ``path``: path of the SQLite database file, or ``':memory:'``
+    - ``connection``: ``sqlite3.Connection`` to the database
+    """
+
+    def __init__(self, path):
+        """
+        Open the store at the given path, creating the database file and tables if necessary.
+        """
+        self.path = path
+        self.connection = sqlite3.connect(str(path))
+        self.connection.executescript(SCHEMA)
+
+    def close(self):
+        self.connection.close()
+
+    def get_project_id(self, name):
+        """
+        Return the ID of the project with the given name in this store, or ``None`` if there is no such project.
+        """
+        row = self.connection.execute(
+          'SELECT id FROM projects WHERE name = ?', (name,)).fetchone()
+        return None if row is None else row[0]
+
+    def get_names(self):
+        """
+        Return the list of the names of the projects in this store.
+        """
+        return [row[0] for row in self.connection.execute(
+          'SELECT name FROM projects ORDER BY name')]
+
+    def delete_project(self, name):
+        """
+        Delete the project with the given name and all its rows from this store, if present.
+        """
+        project_id = self.get_project_id(name)
+        if project_id is None:
+            return
+        with self.connection:
+            for table in ['timesheet', 'rates', 'tasks', 'workers']:
+                self.connection.execute('DELETE FROM {!s} '\
+                  'WHERE project_id = ?'.format(table), (project_id,))
+            self.connection.execute('DELETE FROM projects WHERE id = ?',
+              (project_id,))
+
+    def add_project(self, project, replace=False):
+        """
+        Add the given project, with its attributes, tasks, workers, and timesheet (if any), to this store.
+        If a project of the same name is already in the store, then replace it if ``replace`` and raise a ``ValueError`` otherwise.
+        """
+        if self.get_project_id(project.name) is not None:
+            if not replace:
+                raise ValueError('The store already has a project named '\
+                  '{!s}'.format(project.name))
+            self.delete_project(project.name)
+
+        with self.connection:
+            c = self.connection.execute('INSERT INTO projects '\
+              '(name, description, client, budget, currency) '\
+              'VALUES (?, ?, ?, ?, ?)', (project.name, project.description,
+              project.client, float(project.budget), project.currency))
+            project_id = c.lastrowid
+            self.connection.executemany('INSERT INTO tasks '\
+              '(project_id, task, budget) VALUES (?, ?, ?)',
+              [(project_id, t, float(b)) for t, b in
+              project.tasks_df[['task', 'budget']].values])
+            self.connection.executemany('INSERT INTO workers '\
+              '(project_id, worker, rate) VALUES (?, ?, ?)',
+              [(project_id, w, float(r)) for w, r in
+              project.workers_df[['worker', 'rate']].values])
+        if project.rates_df is not None:
+            r = project.rates_df
+            workers_df = self.read_table('workers', project_id)
+            with self.connection:
+                self.connection.executemany('INSERT INTO rates '\
+                  '(project_id, worker_id, effective_date, rate) '\
+                  'VALUES (?, ?, ?, ?)', zip(
+                  [project_id]*r.shape[0],
+                  workers_df['id'].values[ut.get_positions(r['worker'],
+                    workers_df['worker'])].tolist(),
+                  r['effective_date'].values.astype('M8[D]')\
+                    .astype(np.int64).tolist(),
+                  r['rate'].values.astype(float).tolist(),
+                  ))
+        if project.timesheet_df is not None:
+            self.append_timesheet(project.name, project.timesheet_df)
+
+    def append_timesheet(self, name, timesheet_df):
+        """
+        Append the rows of the given timesheet data frame, assumed checked against the tasks and workers of the project with the given name, to the timesheet of that project in this store.
+        """
+        project_id = self.get_project_id(name)
+        tasks_df = self.read_table('tasks', project_id)
+        workers_df = self.read_table('workers', project_id)
+        f = timesheet_df
+        rows = zip(
+          [project_id]*f.shape[0],
+          (f['date'].values.astype('M8[D]').astype(np.int64)).tolist(),
+          tasks_df['id'].values[ut.get_positions(f['task'],
+            tasks_df['task'])].tolist(),
+          workers_df['id'].values[ut.get_positions(f['worker'],
+            workers_df['worker'])].tolist(),
+          f['duration'].values.astype(float).tolist(),
+          )
+        with self.connection:
+            self.connection.executemany('INSERT INTO timesheet '\
+              '(project_id, date, task_id, worker_id, duration) '\
+              'VALUES (?, ?, ?, ?, ?)', rows)
+
+    def read_table(self, table, project_id):
+        """
+        Return the rows of the given table (``'tasks'`` or ``'workers'``) of the project with the given ID as a data frame, in insertion order.
+        """
+        cols = {
+          'tasks': ['id', 'task', 'budget'],
+          'workers': ['id', 'worker', 'rate'],
+          }[table]
+        return pd.read_sql_query('SELECT {!s} FROM {!s} '\
+          'WHERE project_id = ? ORDER BY id'.format(', '.join(cols), table),
+          self.connection, params=(project_id,))
+
+    def read_attrs(self, name):
+        """
+        Return a dictionary of the attributes of the project with the given name, in the form of the keyword arguments of the Project class, except for the timesheet.
+        Raise a ``KeyError`` if there is no such project.
+        """
+        project_id = self.get_project_id(name)
+        if project_id is None:
+            raise KeyError('The store has no project named {!s}'.format(
+              name))
+        row = self.connection.execute('SELECT name, description, client, '\
+          'budget, currency FROM projects WHERE id = ?',
+          (project_id,)).fetchone()
+        d = OrderedDict(zip(['name', 'description', 'client', 'budget',
+          'currency'], row))
+        d['tasks_df'] = self.read_table('tasks', project_id)\
+          .drop('id', axis=1)
+        d['workers_df'] = self.read_table('workers', project_id)\
+          .drop('id', axis=1)
+        r = pd.read_sql_query('SELECT w.worker, r.effective_date, r.rate '\
+          'FROM rates r JOIN workers w ON w.id = r.worker_id '\
+          'WHERE r.project_id = ? ORDER BY r.rowid', self.connection, 
+          params=(project_id,))
+        if not r.empty:
+            r['effective_date'] = (r['effective_date'].values\
+              .astype(np.int64)*DAY).astype('M8[ns]')
+            d['rates_df'] = r
+        return d
+
+    def get_where(self, project_id, start=None, end=None):
+        """
+        Return the pair (SQL WHERE clause, parameters) selecting the timesheet rows of the project with the given ID with dates from ``start`` to ``end`` inclusive, where a ``None`` bound means no bound.
+        """
+        where = ['s.project_id = ?']
+        params = [project_id]
+        if start is not None:
+            where.append('s.date >= ?')
+            params.append(to_days(start, round_up=True))
+        if end is not None:
+            where.append('s.date <= ?')
+            params.append(to_days(end))
+        return 'WHERE ' + ' AND '.join(where), params
+
+    def compute_costs(self, name, budget, start=None, end=None):
+        """
+        Return the timesheet of the project with the given name, restricted to the dates from ``start`` to ``end`` inclusive, with its costs in the form output by :func:`main.compute_costs`, using the given project budget.
+        The join with the tasks and workers is done in SQLite.
+        """
+        project_id = self.get_project_id(name)
+        where, params = self.get_where(project_id, start, end)
+        f = pd.read_sql_query('SELECT s.date, t.task, w.worker, '\
+          's.duration, t.budget AS task_budget, {!s} AS rate '\
+          'FROM timesheet s '\
+          'JOIN tasks t ON t.id = s.task_id '\
+          'JOIN workers w ON w.id = s.worker_id '\
+          '{!s} ORDER BY s.rowid'.format(RATE, where), self.connection,
+          params=params)
+        f['cost'] = f['duration']*f['rate']
+        f['date'] = (f['date'].values.astype(np.int64)*DAY).astype('M8[ns]')
+        for col in ['task', 'worker']:
+            f[col] = f[col].astype('category')
+        f['cost/task_budget'] = f['cost']/f['task_budget']
+        f['cost/project_budget'] = f['cost']/budget
+        return f
+
+    def aggregate(self, name, by_task=False, by_worker=False, freq=None,
+      start=None, end=None):
+        """
+        Group the timesheet costs of the project with the given name by date period (if ``freq`` is given), by task (if ``by_task``), and by worker (if ``by_worker``), restricted to the dates from ``start`` to ``end`` inclusive, and return the result in the form output by :func:`main.aggregate_costs`.
+
+        The join and grouping are done in SQLite.
+        For ``freq``, the distinct days of the timesheet are fetched, grouped into periods with :func:`utilities.get_periods`, and stored in a temporary table of (day, period label) that the timesheet is joined with, so that periods match those of Pandas for any frequency.
+        """
+        project_id = self.get_project_id(name)
+        where, params = self.get_where(project_id, start, end)
+        keys = []
+        join = ''
+        if freq is not None:
+            days = np.array([row[0] for row in self.connection.execute(
+              'SELECT DISTINCT s.date FROM timesheet s {!s} '\
+              'ORDER BY s.date'.format(where), params)], dtype=np.int64)
+            buckets = days
+            if days.size:
+                labels, sizes = ut.get_periods(
+                  (days*DAY).astype('M8[ns]'), freq)
+                buckets = np.repeat(labels.values.astype('M8[ns]')\
+                  .astype(np.int64), sizes)
+            self.connection.execute('CREATE TEMP TABLE IF NOT EXISTS '\
+              'buckets (date INTEGER PRIMARY KEY, label INTEGER NOT NULL)')
+            self.connection.execute('DELETE FROM temp.buckets')
+            self.connection.executemany('INSERT INTO temp.buckets '\
+              'VALUES (?, ?)', zip(days.tolist(), buckets.tolist()))
+            join = 'JOIN temp.buckets b ON b.date = s.date'
+            keys.append('b.label')
+        if by_task:
+            keys.append('s.task_id')
+        if by_worker:
+            keys.append('s.worker_id')
+
+        query = 'SELECT {!s} TOTAL(s.duration), '\
+          'TOTAL(s.duration*{!s}), MIN(t.budget) FROM timesheet s '\
+          'JOIN tasks t ON t.id = s.task_id '\
+          'JOIN workers w ON w.id = s.worker_id {!s} {!s}'.format(
+          ''.join(k + ', ' for k in keys), RATE, join, where)
+        if keys:
+            query += ' GROUP BY ' + ', '.join(keys)
+        rows = self.connection.execute(query, params).fetchall()
+
+        cols = ['duration', 'cost', 'task_budget']
+        g = pd.DataFrame(rows, columns=list(range(len(keys))) + cols)
+        g.insert(len(keys) + 1, 'rate', ut.get_effective_rates(g['cost'],
+          g['duration']))
+        cols.insert(1, 'rate')
+        if freq is None and not keys:
+            return g[cols]
+
+        # Name groups and sort them in date, task, worker order
+        h = pd.DataFrame()
+        if freq is not None:
+            h['date'] = g[0].values.astype(np.int64).astype('M8[ns]')
+        k = int(freq is not None)
+        for col, table, keep in [('task', 'tasks', by_task),
+          ('worker', 'workers', by_worker)]:
+            if not keep:
+                continue
+            names = self.read_table(table, project_id)\
+              .set_index('id')[col]
+            categories = pd.Index(sorted(names.values))
+            codes = categories.get_indexer(names.reindex(g[k]).values)
+            h[col] = pd.Categorical.from_codes(codes, categories)
+            k += 1
+        for col in cols:
+            h[col] = g[col].values
+        if not by_task:
+            h['task_budget'] = np.nan
+
+        h = h.sort_values(list(h.columns[:len(keys)]))\
+          .reset_index(drop=True)
+        for col in ['task', 'worker']:
+            if col in h.columns:
+                h[col] = h[col].cat.remove_unused_categories()
+        return h
@@ -1,7 +1,9 @@
 import io
+import sys
+from collections import OrderedDict
 
 import pandas as pd
-import colorlover as cl
+import numpy as np
 
 
 def parse_df(csv_text, **kwargs):
@@ -19,6 +21,126 @@ def get_colors(opacity=1):
     """
     Return a list of 10 nice qualitative-scale RGBA color strings of the form 'rgba(*,*,*,*)' and with the given opacity.
     """
+    import colorlover as cl
+
     n = 10
     return [add_opacity(x, opacity) 
       for x in cl.scales[str(n)]['qual']['Set3']]
+
+def get_positions(values, keys):
+    """
+    Given a Series ``values`` and a list-like ``keys`` of distinct items, return a NumPy integer array giving the position in ``keys`` of each value, or -1 for values that are not keys.
+
+    The lookup is done once per distinct value via the categorical codes of ``values`` and then broadcast to all the values by array indexing.
+    """
+    if not hasattr(values, 'cat'):
+        values = values.astype('category')
+    pos = pd.Index(keys).get_indexer(values.cat.categories)
+    codes = values.cat.codes.values
+    return np.where(codes >= 0, pos[codes], -1)
+
+def get_asof_positions(groups, dates, table_groups, table_dates):
+    """
+    Given integer group codes and dates of some rows, and integer group codes and dates of the rows of a table, return a NumPy array holding, for each row, the position in the table of the table row of the same group with the latest date on or before the day of the row's date, or -1 if there is none.
+    Both kinds of rows are keyed by group and day in one 64-bit integer, so the lookup is a single binary search of the row keys among the sorted table keys.
+    """
+    def get_keys(groups, dates):
+        days = np.asarray(dates, dtype='M8[ns]').astype('M8[D]')\
+          .astype(np.int64)
+        return (np.asarray(groups, dtype=np.int64) << 32) + (days + 2**31)
+
+    table_groups = np.asarray(table_groups)
+    table_keys = get_keys(table_groups, table_dates)
+    order = np.argsort(table_keys, kind='mergesort')
+    k = np.searchsorted(table_keys[order], get_keys(groups, dates), 
+      side='right') - 1
+    positions = order[np.maximum(k, 0)]
+
+    # Discard table rows of earlier groups
+    found = (k >= 0) & (table_groups[positions] == np.asarray(groups))
+    return np.where(found, positions, -1)
+
+def get_periods(dates, freq):
+    """
+    Given a sorted array-like of dates and a Pandas frequency string, group the dates into periods as ``pd.Grouper(freq=freq, label='left')`` does.
+    Return a pair ``(labels, sizes)``, where ``labels`` is a DatetimeIndex of the labels of the nonempty periods and ``sizes`` is a NumPy array of the number of dates in each of those periods, so that the dates fall into the periods in runs of the given sizes.
+    """
+    s = pd.Series(np.ones(len(dates)), index=pd.DatetimeIndex(dates))
+    sizes = s.resample(freq, label='left').count()
+    sizes = sizes[sizes > 0]
+    return sizes.index, sizes.values
+
+def get_effective_rates(costs, durations):
+    """
+    Given array-likes of the costs and durations of some groups of timesheet rows, return a NumPy array of the effective rates of the groups, that is, their costs divided by their durations, or NaN for groups of duration 0.
+    This defines the ``'rate'`` column of the summaries of :func:`main.aggregate_costs`, :meth:`cube.Cube.aggregate`, and :meth:`store.Store.aggregate` alike.
+    """
+    costs = np.asarray(costs, dtype=float)
+    durations = np.asarray(durations, dtype=float)
+    return np.divide(costs, durations, out=np.full(len(costs), np.nan), 
+      where=durations != 0)
+
+def concat_categoricals(frames, cols):
+    """
+    Concatenate the given data frames into one with a fresh integer index, giving each of the given columns a categorical dtype whose categories are the sorted union of the values of that column in all the frames.
+    Because the frames then share the categories, the result keeps the columns categorical instead of falling back to object dtype.
+    """
+    frames = [f.copy(deep=False) for f in frames]
+    for col in cols:
+        values = set()
+        for f in frames:
+            if hasattr(f[col], 'cat'):
+                values.update(f[col].cat.categories)
+            else:
+                values.update(f[col].dropna().unique())
+        categories = sorted(values)
+        for f in frames:
+            f[col] = pd.Categorical(f[col], categories=categories)
+    return pd.concat(frames, ignore_index=True)
+
+def compact_timesheet(timesheet_df):
+    """
+    Return a compact copy of the given timesheet data frame, one with
+
+    - ``'date'``: ``int32`` days since 1970-01-01, so times of day are dropped
+    - ``'task'``, ``'worker'``: categoricals, whose codes are the smallest integers that fit
+    - ``'duration'``: ``float32``, exact for durations in quarter hours
+
+    and the same index, using about 10 bytes per row.
+    Compact timesheets are returned as is; see :func:`expand_timesheet` for the reverse.
+    """
+    f = timesheet_df
+    if pd.api.types.is_integer_dtype(f['date']):
+        return f
+    return pd.DataFrame(OrderedDict([
+      ('date', f['date'].values.astype('M8[D]').astype(np.int32)),
+      ('task', f['task'].astype('category').values),
+      ('worker', f['worker'].astype('category').values),
+      ('duration', f['duration'].values.astype(np.float32)),
+      ]), index=f.index)
+
+def expand_timesheet(timesheet_df):
+    """
+    Return a copy of the given timesheet data frame, with its dates as ``datetime64[ns]`` and its durations as ``float64`` if it is compact (see :func:`compact_timesheet`).
+    """
+    f = timesheet_df.copy()
+    if pd.api.types.is_integer_dtype(f['date']):
+        f['date'] = f['date'].values.astype('M8[D]').astype('M8[ns]')
+        f['duration'] = f['duration'].values.astype(float)
+    return f
+
+def get_nbytes(x):
+    """
+    Return an estimate of the number of bytes used by the given object: the deep memory usage for Pandas objects, the size of the data for NumPy arrays, the sum over the attributes for other objects with attributes, and ``sys.getsizeof`` otherwise, with ``None`` using 0 bytes.
+    """
+    if x is None:
+        return 0
+    if isinstance(x, pd.DataFrame):
+        return int(x.memory_usage(deep=True).sum())
+    if isinstance(x, (pd.Series, pd.Index)):
+        return int(x.memory_usage(deep=True))
+    if isinstance(x, np.ndarray):
+        return int(x.nbytes)
+    if hasattr(x, '__dict__'):
+        return sum(get_nbytes(v) for v in vars(x).values())
+    return sys.getsizeof(x)
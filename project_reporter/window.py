@@ -0,0 +1,60 @@
+"""
+This module implements date indexes of timesheets, which answer questions about date windows, that is, sets of dates between a start date and an end date inclusive, without scanning the whole timesheet.
+"""
+import pandas as pd
+import numpy as np
+
+
+def to_datetime64(date):
+    """
+    Convert the given date (string, datetime object, or ``None``) to a NumPy datetime64 in nanoseconds, or to ``None`` if the date is ``None``.
+    """
+    if date is None:
+        return None
+    return np.datetime64(pd.Timestamp(date).value, 'ns')
+
+class DateIndex(object):
+    """
+    This class encodes a date index of a data frame of the form output by :func:`main.compute_costs`.
+    Each instance has the following properties.
+
+    - ``order``: NumPy integer array; positions of the rows of the data frame sorted by date
+    - ``dates``: NumPy datetime64 array; the dates of the rows in sorted order
+    - ``cum_duration``, ``cum_cost``: NumPy float arrays; cumulative sums of the durations and costs of the rows in sorted order, starting with 0
+
+    Finding a window takes two binary searches, and so does totalling it.
+    """
+    def __init__(self, costs_df):
+        dates = costs_df['date'].values.astype('M8[ns]')
+        self.order = np.argsort(dates, kind='mergesort')
+        self.dates = dates[self.order]
+        self.cum_duration = np.concatenate([[0], 
+          np.cumsum(costs_df['duration'].values[self.order])])
+        self.cum_cost = np.concatenate([[0], 
+          np.cumsum(costs_df['cost'].values[self.order])])
+
+    def get_bounds(self, start=None, end=None):
+        """
+        Return the pair of positions (i, j) such that the sorted rows ``i`` up to but excluding ``j`` are those with dates from ``start`` to ``end`` inclusive, where a ``None`` bound means no bound.
+        """
+        start, end = to_datetime64(start), to_datetime64(end)
+        i = 0 if start is None else np.searchsorted(self.dates, start, 
+          side='left')
+        j = len(self.dates) if end is None else np.searchsorted(
+          self.dates, end, side='right')
+        return int(i), max(int(i), int(j))
+
+    def get_totals(self, start=None, end=None):
+        """
+        Return the pair (total duration, total cost) of the rows with dates from ``start`` to ``end`` inclusive.
+        """
+        i, j = self.get_bounds(start, end)
+        return (self.cum_duration[j] - self.cum_duration[i], 
+          self.cum_cost[j] - self.cum_cost[i])
+
+    def get_rows(self, costs_df, start=None, end=None):
+        """
+        Return the rows of the given data frame, the one this index was built from, with dates from ``start`` to ``end`` inclusive, in date order.
+        """
+        i, j = self.get_bounds(start, end)
+        return costs_df.iloc[self.order[i:j]]